@@ -0,0 +1,164 @@
+"""Cold-start benchmark: time to first render in a fresh process.
+
+    python bench/cold_start.py              # measure and compare with the baseline
+    python bench/cold_start.py --update     # measure and rewrite the baseline
+    python bench/cold_start.py --budget-ms 1500
+
+Pods are scaled to zero between classes, so the first learner of the day
+pays for a cold Python process. Each run starts a new interpreter that
+imports Streamlit's test harness (``streamlit_ms``) and then runs ``app.py``
+once (``first_render_ms``: the app's own imports, the catalogue, the case
+and the whole first page). ``total_ms`` is the sum of the two. Interpreter
+startup itself is not counted. The medians of ``--runs`` processes are
+reported.
+
+A run fails when:
+
+* the fastest ``total_ms`` exceeds ``--budget-ms``, if one is given, or
+* the fastest ``first_render_ms`` is slower than the baseline's by
+  ``--time-tolerance``, or
+* one of ``HEAVY_MODULES`` is imported before the first page is out.
+  pandas and pyarrow are only needed for tables (see
+  mystery_case/blocks.py) and are imported by the background warm-up after
+  the first render. This check is the stable signal; wall time depends on
+  the machine.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE = BENCH_DIR / "baselines" / "cold_start.json"
+HEAVY_MODULES = ("pandas", "pyarrow")
+WARM_UP_THREAD = "case-warm-up"  # see _warm_case in app.py
+
+
+class _ImportWatch:
+    """Meta-path hook noting which thread first imports each heavy module."""
+
+    def __init__(self):
+        self.seen = {}
+
+    def find_spec(self, name, path=None, target=None):
+        if name in HEAVY_MODULES and name not in self.seen:
+            self.seen[name] = threading.current_thread().name
+        return None
+
+
+def child() -> None:
+    """One cold measurement in this (fresh) process; prints a JSON line."""
+    watch = _ImportWatch()
+    sys.meta_path.insert(0, watch)
+
+    started = time.perf_counter()
+    from walkthrough import new_session
+
+    imported = time.perf_counter()
+    at = new_session()
+    at.run()
+    rendered = time.perf_counter()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+    row = {
+        "streamlit_ms": round((imported - started) * 1000, 1),
+        "first_render_ms": round((rendered - imported) * 1000, 1),
+        "total_ms": round((rendered - started) * 1000, 1),
+        "heavy_imports": sorted(name for name, thread in watch.seen.items() if thread != WARM_UP_THREAD),
+    }
+    print(json.dumps(row))
+
+
+def measure(runs: int) -> list:
+    env = dict(os.environ, MYSTERY_CASE_PROGRESS="none")
+    rows = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, __file__, "--child"],
+            cwd=BENCH_DIR.parent,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        rows.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return rows
+
+
+def summarise(rows: list) -> dict:
+    summary = {}
+    for metric in ("streamlit_ms", "first_render_ms", "total_ms"):
+        values = [row[metric] for row in rows]
+        summary[metric] = {"median": round(statistics.median(values), 1), "min": min(values)}
+    summary["heavy_imports"] = sorted({name for row in rows for name in row["heavy_imports"]})
+    return summary
+
+
+def compare(summary: dict, baseline: dict, time_tol: float, budget_ms) -> list:
+    regressions = []
+    if budget_ms is not None and summary["total_ms"]["min"] > budget_ms:
+        regressions.append(f"time to first render {summary['total_ms']['min']} ms exceeds the {budget_ms} ms budget")
+    base = baseline.get("first_render_ms")
+    if base is not None and summary["first_render_ms"]["min"] > base["min"] * time_tol:
+        regressions.append(f"first render {summary['first_render_ms']['min']} ms vs baseline {base['min']} ms (fastest run)")
+    if summary["heavy_imports"]:
+        regressions.append(f"imported before the first render: {', '.join(summary['heavy_imports'])}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to measure")
+    parser.add_argument("--update", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--time-tolerance", type=float, default=1.5)
+    parser.add_argument("--budget-ms", type=float, default=None, help="hard limit on the fastest total_ms")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child()
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())["metrics"] if args.baseline.is_file() else {}
+    summary = summarise(measure(args.runs))
+
+    print(f"{'metric':16} {'median':>9} {'min':>9}   baseline")
+    for metric in ("streamlit_ms", "first_render_ms", "total_ms"):
+        row, base = summary[metric], baseline.get(metric)
+        ref = f"{base['min']:.1f} ms" if base else "-"
+        print(f"{metric:16} {row['median']:7.1f}ms {row['min']:7.1f}ms   {ref}")
+    print(f"heavy imports before first render: {', '.join(summary['heavy_imports']) or 'none'}")
+
+    if args.update:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        report = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "runs": args.runs,
+            "metrics": summary,
+        }
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"\nWrote {args.baseline}")
+        return 0
+
+    regressions = compare(summary, baseline, args.time_tolerance, args.budget_ms)
+    if regressions:
+        print("\nCold-start regressions:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo cold-start regressions." if baseline else "\nNo baseline yet; run with --update.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""Headless load test: a classroom of simulated learners walking Steps 1–8.
+
+    python bench/load_test.py                      # 10, 50 and 200 sessions
+    python bench/load_test.py --sessions 50 --out bench/results/load.json
+
+Every simulated learner is an AppTest session running the canonical path in
+walkthrough.py (reveal buttons, text areas, radios, lab orders, the Step 8
+multiselect, "End case"). All sessions of a level start together on a thread
+pool inside this one process, so they contend for the GIL and share the image
+store and case library exactly as learners on one server do.
+
+For each level it reports per-interaction latency percentiles, script passes
+per interaction, per-session state size and process memory. ``--out`` writes
+the same numbers as JSON so releases can be compared. Process RSS includes
+AppTest's own copies of every rendered element tree, so compare it between
+runs of this script rather than reading it as a production figure; the 200
+session level takes several minutes.
+"""
+
+import argparse
+import gc
+import json
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from walkthrough import APP_PATH, new_session, walk
+
+sys.path.insert(0, str(APP_PATH.parent))
+from mystery_case.sessions import deep_sizeof, rss_bytes  # noqa: E402
+from mystery_case.timing import PERCENTILES, percentile  # noqa: E402
+
+LEVELS = (10, 50, 200)
+
+
+def run_session(timeout: float) -> dict:
+    """Walk one learner through the case; return latencies and pass counts."""
+    latencies, passes = {}, {}
+    last = {"t": time.perf_counter(), "runs": 0}
+
+    def record(name, at):
+        now = time.perf_counter()
+        runs = at.session_state["script_runs"]
+        latencies[name] = now - last["t"]
+        passes[name] = runs - last["runs"]
+        last.update(t=time.perf_counter(), runs=runs)
+
+    at = walk(new_session(timeout), on_interaction=record)
+    state_bytes = deep_sizeof(at.session_state.to_dict())
+    return {"latencies": latencies, "passes": passes, "state_bytes": state_bytes}
+
+
+def _percentiles(values) -> dict:
+    values = sorted(values)
+    row = {f"p{p}_ms": round(percentile(values, p) * 1000, 1) for p in PERCENTILES}
+    row["max_ms"] = round(values[-1] * 1000, 1)
+    return row
+
+
+def run_level(sessions: int, concurrency: int, timeout: float) -> dict:
+    gc.collect()
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(sessions, concurrency)) as pool:
+        results = list(pool.map(lambda _: run_session(timeout), range(sessions)))
+    wall = time.perf_counter() - started
+
+    names = list(results[0]["latencies"])
+    interactions = {}
+    for name in names:
+        row = {"n": len(results)}
+        row.update(_percentiles([r["latencies"][name] for r in results]))
+        row["passes"] = max(r["passes"][name] for r in results)
+        interactions[name] = row
+
+    all_latencies = [v for r in results for v in r["latencies"].values()]
+    state = [r["state_bytes"] for r in results]
+    return {
+        "sessions": sessions,
+        "concurrency": min(sessions, concurrency),
+        "wall_s": round(wall, 2),
+        "interactions_per_s": round(len(all_latencies) / wall, 1),
+        "overall": _percentiles(all_latencies),
+        "script_runs": {
+            "total": sum(sum(r["passes"].values()) for r in results),
+            "per_session": sum(results[0]["passes"].values()),
+            "extra_passes": [n for n, row in interactions.items() if row["passes"] != 1],
+        },
+        "memory": {
+            "rss_before_bytes": rss_before,
+            "rss_after_bytes": rss_bytes(),
+            "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+            "mean_session_state_bytes": round(sum(state) / len(state)),
+            "max_session_state_bytes": max(state),
+        },
+        "interactions": interactions,
+    }
+
+
+def _print_level(level: dict):
+    mem = level["memory"]
+    print(
+        f"\n== {level['sessions']} sessions (concurrency {level['concurrency']}): "
+        f"{level['wall_s']} s wall, {level['interactions_per_s']} interactions/s"
+    )
+    overall = level["overall"]
+    print("   overall latency  " + "  ".join(f"{k[:-3]} {v:7.1f} ms" for k, v in overall.items()))
+    runs = level["script_runs"]
+    extra = ", ".join(runs["extra_passes"]) or "none"
+    print(f"   script passes    {runs['total']} total, {runs['per_session']} per session, extra: {extra}")
+    print(
+        f"   memory           RSS {mem['rss_before_bytes'] / 1e6:.0f} -> {mem['rss_after_bytes'] / 1e6:.0f} MB "
+        f"(peak {mem['peak_rss_bytes'] / 1e6:.0f} MB), session state "
+        f"{mem['mean_session_state_bytes'] / 1e3:.1f} KB mean / {mem['max_session_state_bytes'] / 1e3:.1f} KB max"
+    )
+    print(f"   {'interaction':28} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  passes")
+    for name, row in level["interactions"].items():
+        print(
+            f"   {name:28} {row['p50_ms']:8.1f} {row['p95_ms']:8.1f} {row['p99_ms']:8.1f} "
+            f"{row['max_ms']:8.1f}  {row['passes']}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=list(LEVELS), help="session counts to simulate")
+    parser.add_argument("--concurrency", type=int, default=200, help="max sessions in flight at once")
+    parser.add_argument("--timeout", type=float, default=600, help="per-run AppTest timeout in seconds")
+    parser.add_argument("--out", type=Path, help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    report = {"python": sys.version.split()[0], "levels": []}
+    for sessions in args.sessions:
+        level = run_level(sessions, args.concurrency, args.timeout)
+        report["levels"].append(level)
+        _print_level(level)
+
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"\nWrote {args.out}")
+    return 1 if any(level["script_runs"]["extra_passes"] for level in report["levels"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
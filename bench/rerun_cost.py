@@ -0,0 +1,214 @@
+"""Micro-benchmark: cost of one full script pass at each step of the case.
+
+    python bench/rerun_cost.py              # measure and compare with the baseline
+    python bench/rerun_cost.py --update     # measure and rewrite the baseline
+
+Each scenario seeds a LearnerState that has completed everything up to and
+including step N (all envelopes, labs and teaching notes of that step open),
+so the pass renders the most that step can show; ``show_all_answers`` adds
+the end-of-case review. After one warm-up pass, every scenario is re-run
+``--repeat`` times and reports wall time and the peak memory allocated during
+the pass (tracemalloc, all threads). It also reports what the pass sent: how
+many elements and images it rendered, the size of their protos, and the
+bytes of the media files (images) it handed to Streamlit, which travel
+separately from the protos.
+
+Results are compared with ``bench/baselines/rerun_cost.json``. The gate is
+on what a pass sends, which is deterministic. A scenario fails if its
+element or image count differs from the baseline, if its proto or media
+bytes grow by more than ``--size-tolerance`` (for example, someone adds a
+full-size image to Step 6), or if its allocations grow by more than
+``--alloc-tolerance``. Wall time depends on the machine and the load, so it
+is informational unless ``--time-tolerance`` is given.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+from walkthrough import APP_PATH, new_session
+
+sys.path.insert(0, str(APP_PATH.parent))
+from mystery_case.cases import shared_library  # noqa: E402
+from mystery_case.state import Flag, LearnerState  # noqa: E402
+
+BASELINE = Path(__file__).resolve().parent / "baselines" / "rerun_cost.json"
+SCENARIOS = [f"step{n}" for n in range(1, 9)] + ["show_all_answers"]
+
+
+def _correct(choices) -> str:
+    return next(c["label"] for c in choices if c.get("correct"))
+
+
+def seeded_state(case, step: int, show_all: bool = False) -> LearnerState:
+    """A learner who has done everything the case offers up to ``step``."""
+    s = LearnerState(case["id"], step=step, revision=case["revision"])
+    s.set(Flag.VIEWED_ALL)
+    if step >= 2:
+        s.clinical_syndrome = "Acute retroviral syndrome"
+        s.likely_pathogen = "HIV, EBV, CMV"
+        s.diagnostic_tests = "HIV Ag/Ab, HIV RNA"
+    if step >= 3:
+        s.diagnosis_first = "Acute HIV"
+        s.set(Flag.STEP3_TEACHING)
+    if step >= 4:
+        s.step4_choice = _correct(case["followup"]["choices"])
+        s.lp_interpretation = "Lymphocytic pleocytosis"
+        s.set(Flag.LP_REVEALED)
+    if step >= 5:
+        s.step5_clinical_syndrome = "Encephalitis"
+        s.step5_likely_pathogen = "HSV-1"
+        s.step5_confirmatory_test = "CSF HSV PCR"
+        s.set(Flag.STEP5_TEACHING)
+    if step >= 6:
+        s.diarrhea_choice = _correct(case["travel"]["diarrhea"]["choices"])
+        s.set(Flag.STEP6_CORRECT)
+    if step >= 7:
+        s.step7_labs = (1 << len(case["fever"]["labs"])) - 1
+        s.step7_dx = "Typhoid fever"
+        s.set(Flag.STEP7_TEACHING)
+    if step >= 8:
+        s.step8_labs = (1 << len(case["tb"]["labs"])) - 1
+        s.step8_oi_selected = tuple(case["tb"]["oi_tests"])
+        s.step8_dx = "Disseminated TB"
+        s.set(Flag.STEP8_READY | Flag.STEP8_TEACHING)
+    if show_all:
+        s.set(Flag.SHOW_ALL_ANSWERS)
+    return s
+
+
+@contextmanager
+def counting_media():
+    """Count the bytes of every media file handed to Streamlit while active."""
+    counted = {"bytes": 0}
+    original = MemoryMediaFileStorage.load_and_get_id
+
+    def load_and_get_id(self, path_or_data, *args, **kwargs):
+        if isinstance(path_or_data, (bytes, bytearray)):
+            counted["bytes"] += len(path_or_data)
+        return original(self, path_or_data, *args, **kwargs)
+
+    MemoryMediaFileStorage.load_and_get_id = load_and_get_id
+    try:
+        yield counted
+    finally:
+        MemoryMediaFileStorage.load_and_get_id = original
+
+
+def measure(case, scenario: str, repeat: int) -> dict:
+    step = 8 if scenario == "show_all_answers" else int(scenario[len("step"):])
+    at = new_session()
+    at.session_state["learner"] = seeded_state(case, step, show_all=scenario == "show_all_answers")
+    at.run()  # warm-up: fills process-wide caches
+    if at.exception:
+        raise RuntimeError(f"{scenario}: {at.exception[0].value}")
+
+    # Timed and traced passes are separate: tracing slows the pass down.
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - started)
+
+    allocs = []
+    tracemalloc.start()
+    try:
+        for _ in range(max(3, repeat // 4)):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            at.run()
+            allocs.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    with counting_media() as media:
+        at.run()
+
+    nodes = list(at.main)
+    return {
+        "median_ms": round(statistics.median(times) * 1000, 2),
+        "min_ms": round(min(times) * 1000, 2),
+        "peak_alloc_kb": round(statistics.median(allocs) / 1024, 1),
+        "elements": len(nodes),
+        "images": sum(1 for n in nodes if getattr(n, "type", None) == "image"),
+        "proto_kb": round(sum(n.proto.ByteSize() for n in nodes if getattr(n, "proto", None) is not None) / 1024, 1),
+        "media_kb": round(media["bytes"] / 1024, 1),
+    }
+
+
+def compare(results: dict, baseline: dict, size_tol: float, alloc_tol: float, time_tol=None) -> list:
+    regressions = []
+    for scenario, row in results.items():
+        base = baseline.get(scenario)
+        if base is None:
+            continue
+        for count in ("elements", "images"):
+            if row[count] != base[count]:
+                regressions.append(f"{scenario}: {row[count]} {count} vs baseline {base[count]}")
+        for size in ("proto_kb", "media_kb"):
+            if size in base and row[size] > base[size] * size_tol:
+                regressions.append(f"{scenario}: {row[size]} KB {size[:-3]} vs baseline {base[size]} KB")
+        if row["peak_alloc_kb"] > base["peak_alloc_kb"] * alloc_tol:
+            regressions.append(f"{scenario}: {row['peak_alloc_kb']} KB allocated vs baseline {base['peak_alloc_kb']} KB")
+        if time_tol is not None and row["min_ms"] > base["min_ms"] * time_tol:
+            regressions.append(f"{scenario}: {row['min_ms']} ms vs baseline {base['min_ms']} ms (fastest pass)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=20, help="measured passes per scenario")
+    parser.add_argument("--update", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--size-tolerance", type=float, default=1.05, help="allowed growth of proto and media bytes")
+    parser.add_argument("--alloc-tolerance", type=float, default=1.2)
+    parser.add_argument("--time-tolerance", type=float, default=None, help="also gate on the fastest pass (off by default)")
+    args = parser.parse_args(argv)
+
+    library = shared_library()
+    case = library.get(library.default_id)
+    baseline = json.loads(args.baseline.read_text())["scenarios"] if args.baseline.is_file() else {}
+
+    results = {}
+    print(f"{'scenario':18} {'median':>9} {'min':>9} {'alloc':>10} {'elements':>9} {'images':>7} {'proto':>8} {'media':>9}   baseline")
+    for scenario in SCENARIOS:
+        row = results[scenario] = measure(case, scenario, args.repeat)
+        base = baseline.get(scenario)
+        ref = f"{base['min_ms']:.1f} ms / {base['peak_alloc_kb']:.0f} KB" if base else "-"
+        print(
+            f"{scenario:18} {row['median_ms']:7.1f}ms {row['min_ms']:7.1f}ms "
+            f"{row['peak_alloc_kb']:8.0f}KB {row['elements']:9} {row['images']:7} {row['proto_kb']:6.1f}KB {row['media_kb']:7.1f}KB   {ref}"
+        )
+
+    if args.update:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        report = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+            "scenarios": results,
+        }
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"\nWrote {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.size_tolerance, args.alloc_tolerance, args.time_tolerance)
+    if regressions:
+        print("\nRegressions against the baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions against the baseline." if baseline else "\nNo baseline yet; run with --update.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
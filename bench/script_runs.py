@@ -0,0 +1,39 @@
+"""Regression check: every interaction costs exactly one script pass.
+
+    python bench/script_runs.py
+
+Walks the canonical path (see walkthrough.py) and reads the ``script_runs``
+counter that ``app.py`` bumps on each full pass. An interaction that mutates
+state and then calls ``st.rerun()`` from the script body shows up as two
+passes. Exits non-zero on any regression.
+"""
+
+import sys
+
+from walkthrough import new_session, walk
+
+
+def main() -> int:
+    failures = []
+    last = {"runs": 0}
+
+    def check(name, at):
+        runs = at.session_state["script_runs"]
+        passes = runs - last["runs"]
+        last["runs"] = runs
+        status = "ok" if passes == 1 else "FAIL"
+        print(f"{status:4} {name:28} {passes} pass(es)")
+        if passes != 1:
+            failures.append(name)
+
+    walk(new_session(), on_interaction=check)
+
+    if failures:
+        print(f"\n{len(failures)} interaction(s) ran the script more than once: {', '.join(failures)}")
+        return 1
+    print("\nAll interactions ran the script exactly once.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""The canonical path through the case, scripted against Streamlit's AppTest.
+
+Shared by the scripts in this folder. ``INTERACTIONS`` is an ordered list of
+``(name, action)`` pairs; each action takes an ``AppTest`` that has already
+run once, performs exactly one user interaction and calls ``.run()``.
+
+Simulated learners keep their progress in memory (``MYSTERY_CASE_PROGRESS``
+defaults to ``none`` here), so a bench run never writes to the real store
+or shows up in cohort analytics.
+"""
+
+import os
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+os.environ.setdefault("MYSTERY_CASE_PROGRESS", "none")
+
+
+def new_session(timeout: float = 60) -> AppTest:
+    return AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+
+
+def button(at: AppTest, prefix: str):
+    for b in at.button:
+        if b.label.startswith(prefix):
+            return b
+    raise LookupError(f"no button starting with {prefix!r}; have {[b.label for b in at.button]}")
+
+
+def text_area(at: AppTest, prefix: str):
+    for ta in at.text_area:
+        if ta.label.startswith(prefix):
+            return ta
+    raise LookupError(f"no text area starting with {prefix!r}")
+
+
+def _click(prefix):
+    return lambda at: button(at, prefix).click().run()
+
+
+def _type(prefix, text):
+    return lambda at: text_area(at, prefix).input(text).run()
+
+
+def _radio(prefix, value):
+    def action(at):
+        radio = next(r for r in at.radio if r.label.startswith(prefix))
+        radio.set_value(value).run()
+
+    return action
+
+
+def _multiselect(values):
+    def action(at):
+        ms = at.multiselect[0]
+        for value in values:
+            ms.select(value)
+        ms.run()
+
+    return action
+
+
+INTERACTIONS = [
+    ("step1_vitals", _click("📩 Vital Signs")),
+    ("step1_history", _click("📩 Additional History")),
+    ("step1_exam", _click("📩 Physical Exam")),
+    ("step1_continue", _click("➡️ I feel comfortable")),
+    ("step2_syndrome", _type("1. What is the", "Acute retroviral syndrome")),
+    ("step2_pathogens", _type("2. Which", "HIV, EBV, CMV, syphilis")),
+    ("step2_tests", _type("4. What", "HIV Ag/Ab, HIV RNA")),
+    ("step2_save_responses", _click("Do not click until instructed")),
+    ("step3_diagnosis", _type("5. What is your", "Acute HIV")),
+    ("step3_save", _click("💾 Save diagnosis")),
+    ("step3_continue", _click("➡️ Case Continues")),
+    ("step4_choice", _radio("Select one option", "CT head without contrast")),
+    ("step4_lp_reveal", _click("📩 Show lumbar puncture")),
+    ("step4_lp_interpretation", _type("9. Interpret", "Lymphocytic pleocytosis")),
+    ("step4_save_lp", _click("Save LP interpretation")),
+    ("step5_syndrome", _type("10. What is the", "Encephalitis")),
+    ("step5_pathogen", _type("11. Which", "HSV-1")),
+    ("step5_test", _type("12. What", "CSF HSV PCR")),
+    ("step5_save", _click("Save Final Answers")),
+    ("step5_continue", _click("➡️ Case Continues...")),
+    ("step6_choice", _radio("What would you like to do", "Order a GI PCR panel and start IV fluids")),
+    ("step6_continue", _click("➡️ There is more")),
+    ("step7_cbc", _click("CBC with differential")),
+    ("step7_cmp", _click("Comprehensive metabolic panel")),
+    ("step7_smear", _click("Peripheral blood smear")),
+    ("step7_blood_cultures", _click("Blood cultures")),
+    ("step7_dx", _type("16. Based on", "Typhoid fever")),
+    ("step7_save_dx", _click("💾 This is my diagnosis")),
+    ("step7_continue", _click("➡️ Continue to next step")),
+    ("step8_cxr", _click("Chest X-ray")),
+    ("step8_ct_head", _click("CT head")),
+    ("step8_oi_tests", _multiselect(["AFB sputum ×3 and MTB PCR", "Serum cryptococcal antigen (CrAg)"])),
+    ("step8_ready", _click("✅ I have the tests")),
+    ("step8_dx", _type("19. Based on", "Disseminated TB")),
+    ("step8_save_dx", _click("💾 I'm a master clinician")),
+    ("end_case", _click("🏁 End case")),
+]
+
+
+def walk(at: AppTest, on_interaction=None):
+    """Run the first pass and every interaction, raising on script errors.
+
+    ``on_interaction(name, at)`` is called after the initial page load
+    (named ``"initial_load"``) and after each interaction.
+    """
+    at.run()
+    _raise_on_exception(at, "initial_load")
+    if on_interaction is not None:
+        on_interaction("initial_load", at)
+    for name, action in INTERACTIONS:
+        action(at)
+        _raise_on_exception(at, name)
+        if on_interaction is not None:
+            on_interaction(name, at)
+    return at
+
+
+def _raise_on_exception(at: AppTest, name: str):
+    if at.exception:
+        raise RuntimeError(f"{name}: {at.exception[0].value}")
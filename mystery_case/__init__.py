@@ -0,0 +1 @@
+"""Support code for the Mystery Case Streamlit app (``app.py``)."""
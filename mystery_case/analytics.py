@@ -0,0 +1,79 @@
+"""Live cohort aggregates over learner answers.
+
+Every saved progress snapshot goes to :meth:`CohortAnalytics.record`. This
+reduces the snapshot to a small set of ``(metric, value)`` answers, such as
+``("step4_choice", "Immediate lumbar puncture")`` or ``("step7_labs", "cbc")``.
+Labs are counted by key (the snapshot's ``lab_keys``), not by bit position,
+so counts keep their meaning when a case file is edited.
+It then applies only the difference from what that learner had counted
+before: one counter goes down for a changed answer and another goes up. An
+update therefore costs the same with 10 learners or 500. A learner's
+answers count once however often they save, reconnect or change their mind,
+and a reset takes them back out.
+
+The dashboard reads the counters directly and never rescans sessions or
+stored records. Counters live in the process; after a restart they refill
+as learners save again. With several workers, each counts the learners it
+serves.
+"""
+
+import threading
+from collections import Counter
+from functools import lru_cache
+
+CHOICE_METRICS = ("step4_choice", "diarrhea_choice")  # single-choice answers
+LAB_METRICS = ("step7_labs", "step8_labs")  # counted by lab key
+
+
+def answers(snapshot: dict) -> frozenset:
+    """The ``(metric, value)`` pairs a snapshot (``LearnerState.to_dict(case)``) counts towards.
+
+    A snapshot without ``lab_keys`` counts no labs, since its bit positions
+    cannot be named safely.
+    """
+    out = [("step", snapshot["step"])]
+    for metric in CHOICE_METRICS:
+        if snapshot.get(metric):
+            out.append((metric, snapshot[metric]))
+    lab_keys = snapshot.get("lab_keys", {})
+    for metric in LAB_METRICS:
+        out.extend((metric, key) for key in lab_keys.get(metric, ()))
+    out.extend(("step8_oi_selected", key) for key in snapshot.get("step8_oi_selected", ()))
+    return frozenset(out)
+
+
+class CohortAnalytics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}  # (cohort, case_id) -> {metric: Counter(value -> learners)}
+        self._counted = {}  # (cohort, case_id, learner_id) -> answers last counted
+
+    def record(self, cohort: str, learner_id: str, snapshot: dict):
+        key = (cohort, snapshot["case_id"])
+        new = answers(snapshot)
+        with self._lock:
+            old = self._counted.get(key + (learner_id,), frozenset())
+            if new == old:
+                return
+            counts = self._counts.setdefault(key, {})
+            for metric, value in old - new:
+                counter = counts[metric]
+                counter[value] -= 1
+                if not counter[value]:
+                    del counter[value]
+            for metric, value in new - old:
+                counts.setdefault(metric, Counter())[value] += 1
+            self._counted[key + (learner_id,)] = new
+
+    def summary(self, cohort: str, case_id: str) -> dict:
+        """``{metric: {value: learners}}`` plus the learner count, copied under the lock."""
+        with self._lock:
+            counts = self._counts.get((cohort, case_id), {})
+            metrics = {metric: dict(counter) for metric, counter in counts.items()}
+        return {"learners": sum(metrics.get("step", {}).values()), "metrics": metrics}
+
+
+@lru_cache(maxsize=None)
+def shared_analytics() -> CohortAnalytics:
+    """Return the process-wide :class:`CohortAnalytics`."""
+    return CohortAnalytics()
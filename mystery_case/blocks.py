@@ -0,0 +1,118 @@
+"""Static case text and tables, compiled once per case revision.
+
+Much of what a learner in the late steps sees is fixed text from the case
+file: the history questions, the exam findings and the travel vignettes with
+their headings. ``app.py`` used to emit these as many small
+``st.markdown`` calls, one per question, answer, bullet or heading, and
+rebuilt the strings on every pass. Each call is its own element to build,
+diff and send.
+
+:func:`static_blocks` joins each such run into one Markdown block. It does
+this once per case ``revision`` (see :mod:`mystery_case.cases`), so a pass
+emits one prebuilt string per block. Editing a case file changes its
+revision, and the blocks are rebuilt on the next open.
+
+Tables get the same treatment. Passing ``st.table`` a dict of lists converts
+it to a DataFrame and then to Arrow on every pass (about 0.8 ms per table).
+:func:`static_tables` builds every vitals, exam and lab table of a case once
+as an immutable ``pyarrow.Table``, which Streamlit serialises in about 20 µs
+to the same bytes. Tables are compiled separately from the text, on first
+use. That keeps pandas and pyarrow (about 0.6 s to import) off a cold
+process's first render, which shows no table.
+"""
+
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+from mystery_case.cases import CACHE_SIZE
+
+_lock = threading.Lock()
+_blocks = OrderedDict()  # (case id, revision) -> blocks, least recently used first
+_tables = OrderedDict()  # (case id, revision) -> tables, least recently used first
+
+# Two-column tables built from a case mapping: dotted path -> column headers.
+KEY_VALUE_TABLES = {
+    "vitals": ("Measurement", "Value"),
+    "labs": ("Test", "Result"),
+    "followup.vitals": ("Measurement", "Value"),
+    "followup.recent_labs": ("Test", "Result"),
+    "followup.exam": ("System", "Finding"),
+    "followup.lp_results": ("CSF Test", "Result"),
+    "tb.vitals": ("Measurement", "Value"),
+    "tb.recent_labs": ("Test", "Result"),
+    "tb.exam": ("System", "Finding"),
+}
+LAB_PANELS = ("fever", "tb")
+
+
+def compile_blocks(case) -> MappingProxyType:
+    """Every static Markdown block of ``case``, by name."""
+    travel, fever = case["travel"], case["fever"]
+    history = "\n\n".join(f"**{question}**\n\n{answer}" for question, answer in case["history"].items())
+    return MappingProxyType(
+        {
+            "history": f"Below are pertinent history questions and responses:\n\n{history}",
+            "exam": "\n".join(f"- {item}" for item in case["exam"]),
+            "travel_intro": (
+                f"{travel['summary']}\n\n"
+                "**New complaint — Bloody diarrhea (2 days after return to California)**\n\n"
+                f"{travel['diarrhea']['vignette']}"
+            ),
+            "fever_intro": f"**New complaint — Fever (2 weeks after return)**\n\n{fever['vignette']}",
+        }
+    )
+
+
+def _frame(columns: dict):
+    # Via pandas, exactly as st.table would convert the dict, so the table
+    # renders the same (including its index column).
+    import pandas as pd
+    import pyarrow as pa
+
+    return pa.Table.from_pandas(pd.DataFrame(columns))
+
+
+def _lookup(case, path: str):
+    node = case
+    for part in path.split("."):
+        node = node[part]
+    return node
+
+
+def compile_tables(case) -> MappingProxyType:
+    """Every static table of ``case``: the key/value tables by dotted path, lab tables as ``<panel>.labs.<key>``."""
+    tables = {}
+    for path, (key_header, value_header) in KEY_VALUE_TABLES.items():
+        rows = _lookup(case, path)
+        tables[path] = _frame({key_header: list(rows.keys()), value_header: list(rows.values())})
+    for panel in LAB_PANELS:
+        for lab in case[panel]["labs"]:
+            if "table" in lab:
+                tables[f"{panel}.labs.{lab['key']}"] = _frame({k: list(v) for k, v in lab["table"].items()})
+    return MappingProxyType(tables)
+
+
+def _compiled_for(cache: OrderedDict, compile, case):
+    key = (case["id"], case["revision"])
+    with _lock:
+        entry = cache.get(key)
+        if entry is not None:
+            cache.move_to_end(key)
+            return entry
+    entry = compile(case)
+    with _lock:
+        cache[key] = entry
+        while len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+    return entry
+
+
+def static_blocks(case) -> MappingProxyType:
+    """The compiled Markdown blocks of ``case``, built on first use per revision."""
+    return _compiled_for(_blocks, compile_blocks, case)
+
+
+def static_tables(case) -> MappingProxyType:
+    """The prebuilt tables of ``case``, built on first use per revision."""
+    return _compiled_for(_tables, compile_tables, case)
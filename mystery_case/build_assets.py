@@ -0,0 +1,170 @@
+"""Offline asset build: ``python -m mystery_case.build_assets``.
+
+Walks the assets folder, encodes a display-sized derivative of every image,
+and writes ``assets/build/manifest.json`` with the source hash, dimensions and
+derivative of each file. The app then loads only the manifest at startup and
+serves the pre-built derivatives, never the raw source images.
+
+Every image filename referenced by a case in ``cases/index.json`` is checked;
+missing files are reported here rather than silently rendering nothing at
+runtime. Pass ``--strict`` to turn them into a non-zero exit status (e.g. in CI).
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+from mystery_case.cases import CASES_DIR, load_case, load_index
+from mystery_case.images import (
+    BUILD_DIR,
+    MANIFEST_VERSION,
+    MAX_WIDTH,
+    encode_derivative,
+    load_manifest,
+    manifest_path,
+)
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def referenced_images(cases_dir: Path = CASES_DIR):
+    """Return every image filename referenced by the cases in the catalogue."""
+    return {
+        filename
+        for info in load_index(cases_dir).values()
+        for filename in load_case(info.path)["images"].values()
+    }
+
+
+def _build_one(root: Path, filename: str, max_width: int, previous: dict):
+    source = root / filename
+    raw = source.read_bytes()
+    digest = _sha256(raw)
+
+    # Reuse the previous derivative when the source is unchanged.
+    old = (previous or {}).get(filename)
+    if (
+        old
+        and old["sha256"] == digest
+        and old["derivative"]["max_width"] == max_width
+        and (root / BUILD_DIR / old["derivative"]["file"]).is_file()
+    ):
+        return old, False
+
+    with Image.open(source) as img:
+        width, height = img.size
+    derivative = encode_derivative(source, max_width)
+    derivative_digest = _sha256(derivative.data)
+    suffix = ".png" if derivative.format == "PNG" else ".jpg"
+    built_name = f"{source.stem}-{derivative_digest[:12]}{suffix}"
+    (root / BUILD_DIR / built_name).write_bytes(derivative.data)
+
+    entry = {
+        "sha256": digest,
+        "width": width,
+        "height": height,
+        "bytes": len(raw),
+        "derivative": {
+            "file": built_name,
+            "sha256": derivative_digest,
+            "format": derivative.format,
+            "width": derivative.width,
+            "height": derivative.height,
+            "bytes": len(derivative.data),
+            "max_width": max_width,
+        },
+    }
+    return entry, True
+
+
+def build(root: Path, max_width: int = MAX_WIDTH, referenced=None):
+    """Build derivatives for ``root`` and return ``(manifest, report)``."""
+    root = Path(root)
+    referenced = set(referenced_images() if referenced is None else referenced)
+    (root / BUILD_DIR).mkdir(parents=True, exist_ok=True)
+
+    previous = (load_manifest(root) or {}).get("images")
+    on_disk = sorted(
+        p.name for p in root.iterdir() if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES
+    )
+
+    images, built, reused, failed = {}, [], [], []
+    for filename in on_disk:
+        try:
+            entry, fresh = _build_one(root, filename, max_width, previous)
+        except Exception as exc:  # unreadable / corrupt image
+            failed.append(f"{filename}: {exc}")
+            continue
+        images[filename] = entry
+        (built if fresh else reused).append(filename)
+
+    missing = sorted(referenced - set(images))
+    for filename in missing:
+        images[filename] = None  # known-missing: the app will not look for it
+
+    manifest = {"version": MANIFEST_VERSION, "max_width": max_width, "images": images}
+    with open(manifest_path(root), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+    # Drop derivatives no longer referenced by the manifest.
+    keep = {e["derivative"]["file"] for e in images.values() if e}
+    for p in (root / BUILD_DIR).iterdir():
+        if p.name != manifest_path(root).name and p.name not in keep:
+            p.unlink()
+
+    report = {
+        "built": built,
+        "reused": reused,
+        "failed": failed,
+        "missing": missing,
+        "unreferenced": sorted(set(on_disk) - referenced),
+    }
+    return manifest, report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m mystery_case.build_assets",
+        description="Build display-sized image derivatives and the asset manifest.",
+    )
+    parser.add_argument("--assets", type=Path, default=Path("assets"), help="assets folder (default: assets)")
+    parser.add_argument("--max-width", type=int, default=MAX_WIDTH, help=f"derivative width bound (default: {MAX_WIDTH})")
+    parser.add_argument("--strict", action="store_true", help="exit non-zero if a referenced image is missing")
+    args = parser.parse_args(argv)
+
+    if not args.assets.is_dir():
+        parser.error(f"assets folder not found: {args.assets}")
+
+    manifest, report = build(args.assets, args.max_width)
+    images = [e for e in manifest["images"].values() if e]
+    source = sum(e["bytes"] for e in images)
+    derived = sum(e["derivative"]["bytes"] for e in images)
+
+    print(f"Wrote {manifest_path(args.assets)}")
+    print(
+        f"  {len(report['built'])} built, {len(report['reused'])} unchanged, "
+        f"{source / 1e6:.1f} MB of sources -> {derived / 1e6:.1f} MB of derivatives"
+    )
+    for filename in report["unreferenced"]:
+        print(f"  note: {filename} is not referenced by the case")
+    for line in report["failed"]:
+        print(f"  error: could not read {line}", file=sys.stderr)
+    for filename in report["missing"]:
+        print(f"  missing: {filename} is referenced by the case but not in {args.assets}/", file=sys.stderr)
+
+    if report["failed"] or (args.strict and report["missing"]):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
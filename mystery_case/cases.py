@@ -0,0 +1,298 @@
+"""Declarative case files and the case library.
+
+A case is a JSON file under ``cases/`` holding everything the learner reads:
+vignettes, vitals, labs, answer choices with their feedback, teaching notes and
+the image filenames. ``app.py`` only decides how and when each piece appears.
+
+``cases/index.json`` lists the catalogue (id and title of every case). A
+:class:`CaseLibrary` reads only that index at startup; a case file is parsed,
+validated and frozen the first time a learner opens it, then shared by every
+session as a read-only view. At most ``capacity`` parsed cases are kept; the
+least recently opened one is dropped first, so memory stays bounded however
+large the catalogue grows.
+
+Every parsed case also carries a ``revision``, a hash of its file's contents,
+which keys caches of anything derived from a case (rendered blocks, reports).
+The case's own ``version`` is its schema version.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+
+from mystery_case.sessions import deep_sizeof
+
+CASES_DIR = Path(__file__).resolve().parent.parent / "cases"
+INDEX_NAME = "index.json"
+INDEX_VERSION = 1
+CACHE_SIZE = 8  # parsed cases kept in memory per process
+
+TONES = ("info", "success", "warning", "error")
+TEACHING_STEPS = ("step3", "step5", "step6", "step7", "step8")  # teaching notes app.py shows
+TEACHING_UPDATES = ("step3", "step5", "step8")  # steps whose notes open with an ``update``
+_COLOUR = re.compile(r"#[0-9A-Fa-f]{6}")
+
+
+class CaseError(ValueError):
+    """A case file is missing, unreadable or does not match the format."""
+
+
+def freeze(value):
+    """Return a deeply read-only copy of parsed JSON (mappings and tuples)."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+# --------------------------------------------------------------------------
+# Validation
+# --------------------------------------------------------------------------
+def _get(data, path: str, kind, optional: bool = False):
+    node = data
+    for part in path.split("."):
+        if not isinstance(node, dict) or part not in node:
+            if optional:
+                return None
+            raise CaseError(f"missing required field '{path}'")
+        node = node[part]
+    if not isinstance(node, kind):
+        names = kind.__name__ if isinstance(kind, type) else " or ".join(k.__name__ for k in kind)
+        raise CaseError(f"'{path}' must be {names}, not {type(node).__name__}")
+    return node
+
+
+def _check_table(table, where: str):
+    if not isinstance(table, dict) or not table:
+        raise CaseError(f"'{where}' must be a non-empty mapping of column -> values")
+    lengths = {len(_get(table, col, list)) for col in table}
+    if len(lengths) != 1:
+        raise CaseError(f"columns of '{where}' have different lengths")
+
+
+def _check_labs(data, path: str):
+    labs = _get(data, path, list)
+    seen = set()
+    for i, lab in enumerate(labs):
+        where = f"{path}[{i}]"
+        if not isinstance(lab, dict):
+            raise CaseError(f"'{where}' must be an object")
+        for field in ("key", "label", "title"):
+            _get(lab, field, str)
+        if lab["key"] in seen:
+            raise CaseError(f"duplicate lab key '{lab['key']}' in '{path}'")
+        seen.add(lab["key"])
+        for field in ("text", "info", "fallback", "image", "image_caption"):
+            _get(lab, field, str, optional=True)
+        if "table" in lab:
+            _check_table(lab["table"], f"{where}.table")
+        if "image" in lab and lab["image"] not in data["images"]:
+            raise CaseError(f"'{where}.image' refers to unknown image '{lab['image']}'")
+
+
+def _check_choices(data, path: str):
+    choices = _get(data, path, list)
+    if not choices:
+        raise CaseError(f"'{path}' must list at least one choice")
+    for i, choice in enumerate(choices):
+        where = f"{path}[{i}]"
+        if not isinstance(choice, dict):
+            raise CaseError(f"'{where}' must be an object")
+        _get(choice, "label", str)
+        _get(choice, "feedback", str)
+        _get(choice, "correct", bool, optional=True)
+        if choice.get("tone", "info") not in TONES:
+            raise CaseError(f"'{where}.tone' must be one of {', '.join(TONES)}")
+    if not any(c.get("correct") for c in choices):
+        raise CaseError(f"'{path}' has no choice marked correct")
+
+
+def validate(data):
+    """Raise :class:`CaseError` if ``data`` is not a well-formed case."""
+    if not isinstance(data, dict):
+        raise CaseError("a case file must contain a JSON object")
+
+    _get(data, "id", str)
+    _get(data, "version", int)
+    _get(data, "title", str)
+    images = _get(data, "images", dict)
+    for key, filename in images.items():
+        if not isinstance(filename, str) or not filename:
+            raise CaseError(f"'images.{key}' must be a filename")
+
+    for path in ("vignette", "followup.vignette", "followup.ct_head_result", "followup.lp_reminder",
+                 "travel.summary", "travel.diarrhea.vignette", "fever.vignette", "tb.vignette",
+                 "tb.attending_prompt"):
+        _get(data, path, str)
+    for path in ("vitals", "history", "labs", "followup.vitals", "followup.exam", "followup.recent_labs",
+                 "followup.lp_results", "tb.vitals", "tb.exam", "tb.recent_labs", "tb.oi_tests"):
+        _get(data, path, dict)
+    _get(data, "exam", list)
+
+    _check_choices(data, "followup.choices")
+    _check_choices(data, "travel.diarrhea.choices")
+    _check_labs(data, "fever.labs")
+    _check_labs(data, "tb.labs")
+
+    for key, test in data["tb"]["oi_tests"].items():
+        for field in ("label", "result", "reason"):
+            _get(test, field, str)
+        _get(test, "reasonable", bool)
+
+    for step, colour in (_get(data, "theme.backgrounds", dict, optional=True) or {}).items():
+        if not step.isdigit() or not isinstance(colour, str) or not _COLOUR.fullmatch(colour):
+            raise CaseError(f"'theme.backgrounds.{step}' must map a step number to a #RRGGBB colour")
+
+    teaching = _get(data, "teaching", dict)
+    for step in TEACHING_STEPS:
+        _get(data, f"teaching.{step}", dict)
+    for step in teaching:
+        _get(data, f"teaching.{step}.title", str)
+        _get(data, f"teaching.{step}.notes", str)
+        _get(data, f"teaching.{step}.update", str, optional=step not in TEACHING_UPDATES)
+        _get(data, f"teaching.{step}.image_caption", str, optional=True)
+        image = _get(data, f"teaching.{step}.image", str, optional=True)
+        if image is not None and image not in images:
+            raise CaseError(f"'teaching.{step}.image' refers to unknown image '{image}'")
+
+
+# --------------------------------------------------------------------------
+# Loading
+# --------------------------------------------------------------------------
+def parse_case(text: str, source: str = "<string>"):
+    try:
+        data = json.loads(text)
+    except ValueError as exc:
+        raise CaseError(f"{source}: not valid JSON ({exc})") from None
+    try:
+        validate(data)
+    except CaseError as exc:
+        raise CaseError(f"{source}: {exc}") from None
+    data["revision"] = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    return freeze(data)
+
+
+def load_case(path) -> MappingProxyType:
+    """Parse, validate and freeze the case file at ``path`` (uncached)."""
+    path = Path(path)
+    try:
+        text = path.read_text(encoding="utf-8")
+    except OSError as exc:
+        raise CaseError(f"cannot read case file {path}: {exc.strerror}") from None
+    return parse_case(text, str(path))
+
+
+@dataclass(frozen=True)
+class CaseInfo:
+    id: str
+    title: str
+    path: Path
+
+
+def load_index(cases_dir: Path = CASES_DIR):
+    """Return ``{case_id: CaseInfo}`` from ``cases_dir/index.json``, in catalogue order."""
+    path = Path(cases_dir) / INDEX_NAME
+    try:
+        with open(path, encoding="utf-8") as f:
+            index = json.load(f)
+    except OSError as exc:
+        raise CaseError(f"cannot read case index {path}: {exc.strerror}") from None
+    except ValueError as exc:
+        raise CaseError(f"{path}: not valid JSON ({exc})") from None
+
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        raise CaseError(f"{path}: expected an index with version {INDEX_VERSION}")
+    entries = {}
+    for i, entry in enumerate(_get(index, "cases", list)):
+        try:
+            case_id = _get(entry, "id", str)
+            title = _get(entry, "title", str)
+        except CaseError as exc:
+            raise CaseError(f"{path}: cases[{i}]: {exc}") from None
+        if case_id in entries:
+            raise CaseError(f"{path}: duplicate case id '{case_id}'")
+        case_path = Path(cases_dir) / f"{case_id}.json"
+        if not case_path.is_file():
+            raise CaseError(f"{path}: case '{case_id}' has no file {case_path.name}")
+        entries[case_id] = CaseInfo(case_id, title, case_path)
+    if not entries:
+        raise CaseError(f"{path}: the catalogue is empty")
+    return entries
+
+
+class CaseLibrary:
+    """Catalogue of cases with lazy loading and LRU eviction.
+
+    Cases are keyed by id and re-parsed if their file changes on disk. Evicting
+    a case only drops the shared parsed copy; sessions keep just the case id
+    and get it reloaded on their next rerun.
+    """
+
+    def __init__(self, cases_dir: Path = CASES_DIR, capacity: int = CACHE_SIZE):
+        self.cases_dir = Path(cases_dir)
+        self.capacity = max(1, capacity)
+        self.index = load_index(self.cases_dir)
+        self._lock = threading.Lock()
+        self._cases = OrderedDict()  # case_id -> (mtime_ns, frozen case, bytes), oldest first
+        self._hits = 0
+        self._loads = 0
+        self._evictions = 0
+
+    @property
+    def default_id(self) -> str:
+        return next(iter(self.index))
+
+    def __contains__(self, case_id) -> bool:
+        return case_id in self.index
+
+    def get(self, case_id: str) -> MappingProxyType:
+        info = self.index.get(case_id)
+        if info is None:
+            raise CaseError(f"unknown case '{case_id}'")
+        try:
+            mtime = info.path.stat().st_mtime_ns
+        except OSError as exc:
+            raise CaseError(f"cannot read case file {info.path}: {exc.strerror}") from None
+
+        with self._lock:  # parse each file once even if many sessions open it together
+            entry = self._cases.get(case_id)
+            if entry is not None and entry[0] == mtime:
+                self._cases.move_to_end(case_id)
+                self._hits += 1
+                return entry[1]
+
+            case = load_case(info.path)
+            if case["id"] != case_id:
+                raise CaseError(f"{info.path}: id '{case['id']}' does not match the index ('{case_id}')")
+            self._loads += 1
+            self._cases[case_id] = (mtime, case, deep_sizeof(case))
+            self._cases.move_to_end(case_id)
+            while len(self._cases) > self.capacity:
+                self._cases.popitem(last=False)
+                self._evictions += 1
+            return case
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "catalogue": len(self.index),
+                "loaded": list(self._cases),
+                "capacity": self.capacity,
+                "hits": self._hits,
+                "loads": self._loads,
+                "evictions": self._evictions,
+                "cached_bytes": sum(entry[2] for entry in self._cases.values()),
+            }
+
+
+@lru_cache(maxsize=None)
+def shared_library(cases_dir: Path = CASES_DIR) -> CaseLibrary:
+    """Return the process-wide :class:`CaseLibrary` for ``cases_dir``."""
+    return CaseLibrary(cases_dir)
@@ -0,0 +1,183 @@
+"""Bulk export of stored learner responses: ``python -m mystery_case.export``.
+
+    python -m mystery_case.export responses.parquet
+    python -m mystery_case.export responses.csv --case fever_sore_throat --since 2026-01-01
+    python -m mystery_case.export - --format ndjson | gzip > responses.ndjson.gz
+
+Every record in the progress store (``MYSTERY_CASE_PROGRESS``, or ``--store``)
+becomes one row with the columns in :data:`COLUMNS`: the learner, the case,
+every free-text and single-choice answer, and the labs and OI tests ordered,
+as ``;``-separated keys. Labs are named by the keys saved with the snapshot,
+so records from before a case edit keep their names. A record without them
+is named from the case file only if the file is still at the record's
+revision; otherwise its labs are listed by position.
+
+Records are streamed from the store in batches and written batch by batch,
+as CSV rows, JSON lines or one Parquet row group at a time, so memory does
+not grow with the size of the store. The format follows the file suffix
+unless ``--format`` is given. Parquet needs ``pyarrow``.
+
+A SQLite store is opened read-only, and one that does not exist is an error,
+not a new empty store.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from mystery_case.cases import CaseError, shared_library
+from mystery_case.progress import DEFAULT_URL, open_store
+from mystery_case.state import LAB_PANELS
+
+ANSWER_FIELDS = (
+    "clinical_syndrome",
+    "likely_pathogen",
+    "diagnostic_tests",
+    "diagnosis_first",
+    "step4_choice",
+    "lp_interpretation",
+    "step5_clinical_syndrome",
+    "step5_likely_pathogen",
+    "step5_confirmatory_test",
+    "diarrhea_choice",
+    "step7_dx",
+    "step8_dx",
+)
+COLUMNS = ("learner_id", "case_id", "updated_at", "step") + ANSWER_FIELDS + ("step7_labs", "step8_labs", "step8_oi_selected")
+FORMATS = ("parquet", "csv", "ndjson")
+BATCH_SIZE = 5000
+
+
+def _lab_keys(case, snapshot: dict, group: str) -> str:
+    if "lab_keys" in snapshot:
+        return ";".join(snapshot["lab_keys"].get(group, ()))
+    mask = snapshot.get(group, 0)
+    current = case is not None and snapshot.get("revision") == case["revision"]
+    labs = case[LAB_PANELS[group]]["labs"] if current else ()
+    return ";".join(
+        labs[i]["key"] if i < len(labs) else str(i) for i in range(mask.bit_length()) if mask >> i & 1
+    )
+
+
+def rows(store, case_id=None, since=None, batch_size: int = BATCH_SIZE):
+    """Yield one export row (a dict keyed by :data:`COLUMNS`) per stored record."""
+    library = shared_library()
+    for learner_id, record_case, updated_at, snapshot in store.scan(batch_size):
+        if case_id is not None and record_case != case_id:
+            continue
+        if since is not None and updated_at is not None and updated_at < since:
+            continue
+        try:
+            case = library.get(record_case) if record_case in library else None
+        except CaseError:
+            case = None
+        row = {
+            "learner_id": learner_id,
+            "case_id": record_case,
+            "updated_at": (
+                datetime.fromtimestamp(updated_at, timezone.utc).isoformat(timespec="seconds") if updated_at else None
+            ),
+            "step": snapshot.get("step"),
+        }
+        for name in ANSWER_FIELDS:
+            row[name] = snapshot.get(name, "")
+        row["step7_labs"] = _lab_keys(case, snapshot, "step7_labs")
+        row["step8_labs"] = _lab_keys(case, snapshot, "step8_labs")
+        row["step8_oi_selected"] = ";".join(snapshot.get("step8_oi_selected", ()))
+        yield row
+
+
+def _batches(iterable, size: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_csv(records, out):
+    writer = csv.DictWriter(out, fieldnames=COLUMNS)
+    writer.writeheader()
+    n = 0
+    for row in records:
+        writer.writerow(row)
+        n += 1
+    return n
+
+
+def write_ndjson(records, out):
+    n = 0
+    for row in records:
+        out.write(json.dumps(row, ensure_ascii=False) + "\n")
+        n += 1
+    return n
+
+
+def write_parquet(records, path, batch_size: int = BATCH_SIZE):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ModuleNotFoundError:
+        raise SystemExit("Parquet export needs pyarrow: pip install pyarrow (or export to .csv / .ndjson)")
+
+    schema = pa.schema([(name, pa.int64() if name == "step" else pa.string()) for name in COLUMNS])
+    n = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in _batches(records, batch_size):
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            n += len(batch)
+    return n
+
+
+def export(store, target, fmt: str, case_id=None, since=None, batch_size: int = BATCH_SIZE) -> int:
+    """Write every matching record to ``target`` (a path, or ``"-"`` for stdout); return the row count."""
+    records = rows(store, case_id, since, batch_size)
+    if fmt == "parquet":
+        if target == "-":
+            raise SystemExit("Parquet cannot be written to stdout; give a file name")
+        return write_parquet(records, target, batch_size)
+    write = write_csv if fmt == "csv" else write_ndjson
+    if target == "-":
+        return write(records, sys.stdout)
+    with open(target, "w", encoding="utf-8", newline="") as out:
+        return write(records, out)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("target", help="output file (.parquet, .csv, .ndjson), or - for stdout")
+    parser.add_argument("--format", choices=FORMATS, help="output format (default: from the file suffix)")
+    parser.add_argument("--store", default=os.environ.get("MYSTERY_CASE_PROGRESS", DEFAULT_URL), help="progress store URL")
+    parser.add_argument("--case", help="only export this case id")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only records saved on or after this date (UTC)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="records read and written per batch")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or {".parquet": "parquet", ".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}.get(
+        Path(args.target).suffix.lower()
+    )
+    if fmt is None:
+        parser.error("cannot tell the format from the file name; pass --format")
+    since = args.since.replace(tzinfo=args.since.tzinfo or timezone.utc).timestamp() if args.since else None
+
+    try:
+        store = open_store(args.store, read_only=True)
+    except FileNotFoundError as exc:
+        raise SystemExit(f"{exc}; check --store or MYSTERY_CASE_PROGRESS") from None
+    try:
+        n = export(store, args.target, fmt, args.case, since, args.batch_size)
+    finally:
+        store.close()
+    print(f"Exported {n} record(s) as {fmt}.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
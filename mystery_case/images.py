@@ -0,0 +1,296 @@
+"""Process-wide image store for the case assets.
+
+Streamlit re-executes ``app.py`` on every interaction, so anything loaded at
+module level in the script is loaded again for every learner on every click.
+The store below lives in an imported module instead, which Streamlit imports
+once per process, and is shared by all sessions.
+
+Source assets are large PNGs. The store keeps a display-sized, pre-encoded
+derivative of each one (JPEG when the image is opaque, PNG when it has real
+transparency) so ``st.image`` can ship the bytes as-is instead of
+re-encoding a full-resolution image on every rerun.
+
+When ``python -m mystery_case.build_assets`` has been run, derivatives come
+from ``assets/build/manifest.json`` and the source images are never opened
+at runtime (Pillow is not even imported); otherwise they are encoded on
+first use. A manifest entry whose built file is gone or unreadable, for
+example after a partial deploy, is logged as stale, and that image is
+encoded from its source instead.
+"""
+
+import io
+import json
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+# Streamlit's widest content column is 2 × 730 px (see MAXIMUM_CONTENT_WIDTH in
+# streamlit.elements.lib.image_utils); st.image re-encodes anything wider, and
+# anything that is not JPEG/PNG/GIF, so derivatives stay within both limits.
+MAX_WIDTH = 1460
+JPEG_QUALITY = 82
+CACHE_BYTES = 64 * 2**20  # derivative bytes kept in memory per store
+
+BUILD_DIR = "build"  # relative to the assets root
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+@dataclass(frozen=True)
+class Derivative:
+    data: bytes
+    format: str  # "JPEG" or "PNG"
+    width: int
+    height: int
+    source_size: int
+
+
+def _has_transparency(img) -> bool:
+    if img.mode in ("RGBA", "LA"):
+        return img.getchannel("A").getextrema()[0] < 255
+    return img.mode == "P" and "transparency" in img.info
+
+
+def manifest_path(root: Path) -> Path:
+    return Path(root) / BUILD_DIR / MANIFEST_NAME
+
+
+def load_manifest(root: Path):
+    """Return the build manifest under ``root``, or ``None`` if there is none.
+
+    A manifest written by a different ``MANIFEST_VERSION`` is ignored, so a
+    stale build falls back to runtime encoding instead of misreading it.
+    """
+    try:
+        with open(manifest_path(root), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def encode_derivative(path: Path, max_width: int = MAX_WIDTH) -> Derivative:
+    """Decode ``path`` once and return a width-bounded JPEG/PNG encoding."""
+    from PIL import Image  # only needed without a build manifest; keeps Pillow off the cold-start path
+
+    with Image.open(path) as img:
+        img.load()
+        transparent = _has_transparency(img)
+        img = img.convert("RGBA" if transparent else "RGB")
+        if img.width > max_width:
+            height = round(img.height * max_width / img.width)
+            img = img.resize((max_width, height), Image.LANCZOS)
+
+        buf = io.BytesIO()
+        if transparent:
+            img.save(buf, "PNG", optimize=True)
+        else:
+            img.save(buf, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+    return Derivative(
+        data=buf.getvalue(),
+        format="PNG" if transparent else "JPEG",
+        width=img.width,
+        height=img.height,
+        source_size=path.stat().st_size,
+    )
+
+
+class ImageStore:
+    """Thread-safe cache of image derivatives keyed by filename and mtime.
+
+    Missing or unreadable files are remembered too, so an optional asset that
+    is not shipped is looked up once per process instead of once per rerun.
+    Call :meth:`clear` to forget everything (e.g. after replacing assets).
+
+    At most ``max_bytes`` of derivatives are kept; the least recently used
+    image is dropped first, so a large case library only keeps the images of
+    the cases learners currently have open.
+
+    With a ``manifest`` the store only reads the pre-built derivative files it
+    lists; filenames the manifest records as missing are never looked up.
+    Images whose built file is missing (checked once, here) or fails to read
+    are encoded from the source like without a manifest; see :meth:`stale`.
+    """
+
+    def __init__(self, root: Path, max_width: int = MAX_WIDTH, manifest=None, max_bytes: int = CACHE_BYTES):
+        self.root = Path(root)
+        self.max_width = max_width
+        self.manifest = manifest
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._encoding = {}  # filename -> Lock, so each file is encoded once
+        self._entries = OrderedDict()  # filename -> (mtime_ns or manifest sha256, Derivative), oldest first
+        self._bytes = 0
+        self._missing = set()
+        self._stale = set()  # manifest entries whose built file is unusable
+        self._hits = 0
+        self._misses = 0
+        self._negative_hits = 0
+        self._evictions = 0
+        if manifest is not None:
+            for filename, entry in manifest["images"].items():
+                if entry is not None and not (self.root / BUILD_DIR / entry["derivative"]["file"]).is_file():
+                    self._mark_stale(filename, "built file is missing")
+
+    def _mark_stale(self, filename: str, reason: str):
+        with self._lock:
+            if filename in self._stale:
+                return
+            self._stale.add(filename)
+        log.warning("stale build manifest entry for %s (%s); encoding it from the source image", filename, reason)
+
+    def stale(self, filename: str) -> bool:
+        """Whether ``filename`` is served from its source because its manifest entry is unusable."""
+        return filename in self._stale
+
+    def get(self, filename: str):
+        """Return the encoded derivative bytes for ``filename``, or ``None``."""
+        derivative = self.derivative(filename)
+        return derivative.data if derivative is not None else None
+
+    def derivative(self, filename: str):
+        if not filename:
+            return None
+
+        with self._lock:
+            if filename in self._missing:
+                self._negative_hits += 1
+                return None
+
+        if self.manifest is not None and filename not in self._stale:
+            return self._from_manifest(filename)
+        return self._from_source(filename)
+
+    def _from_source(self, filename: str):
+        path = self.root / filename
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            return self._remember_missing(filename)
+
+        entry = self._lookup(filename, mtime)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            encoding = self._encoding.setdefault(filename, threading.Lock())
+        with encoding:
+            # Another session may have finished encoding while we waited.
+            entry = self._lookup(filename, mtime)
+            if entry is not None:
+                return entry
+            try:
+                derivative = encode_derivative(path, self.max_width)
+            except Exception:
+                return self._remember_missing(filename)
+            self._store(filename, mtime, derivative)
+        return derivative
+
+    def _from_manifest(self, filename: str):
+        entry = self.manifest["images"].get(filename)
+        if entry is None:
+            return self._remember_missing(filename)
+
+        built = entry["derivative"]
+        cached = self._lookup(filename, built["sha256"])
+        if cached is not None:
+            return cached
+
+        try:
+            data = (self.root / BUILD_DIR / built["file"]).read_bytes()
+        except OSError as exc:
+            self._mark_stale(filename, f"cannot read {built['file']}: {exc.strerror}")
+            return self._from_source(filename)
+
+        derivative = Derivative(
+            data=data,
+            format=built["format"],
+            width=built["width"],
+            height=built["height"],
+            source_size=entry["bytes"],
+        )
+        self._store(filename, built["sha256"], derivative)
+        return derivative
+
+    def warm(self, filenames):
+        """Encode every file in ``filenames`` ahead of the first request."""
+        for filename in filenames:
+            self.derivative(filename)
+
+    def _lookup(self, filename: str, version):
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(filename)
+                self._hits += 1
+                return entry[1]
+        return None
+
+    def _store(self, filename: str, version, derivative: Derivative):
+        with self._lock:
+            self._misses += 1
+            old = self._entries.pop(filename, None)
+            if old is not None:
+                self._bytes -= len(old[1].data)
+            self._entries[filename] = (version, derivative)
+            self._bytes += len(derivative.data)
+            # Always keep the newest entry, even if it alone exceeds the budget.
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.data)
+                self._evictions += 1
+
+    def _remember_missing(self, filename: str):
+        with self._lock:
+            self._misses += 1
+            self._missing.add(filename)
+            old = self._entries.pop(filename, None)
+            if old is not None:
+                self._bytes -= len(old[1].data)
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._missing.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "negative_hits": self._negative_hits,
+                "evictions": self._evictions,
+                "cached": sorted(self._entries),
+                "missing": sorted(self._missing),
+                "stale": sorted(self._stale),
+                "cached_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "source_bytes": sum(d.source_size for _, d in self._entries.values()),
+            }
+
+    def __repr__(self):
+        s = self.stats()
+        return (
+            f"ImageStore({str(self.root)!r}, hits={s['hits']}, misses={s['misses']}, "
+            f"negative_hits={s['negative_hits']}, evictions={s['evictions']}, cached={len(s['cached'])}, "
+            f"missing={len(s['missing'])})"
+        )
+
+
+@lru_cache(maxsize=None)
+def shared_store(root: Path) -> ImageStore:
+    """Return the process-wide :class:`ImageStore` for ``root``.
+
+    The build manifest, if present, is read here exactly once per process.
+    """
+    return ImageStore(root, manifest=load_manifest(root))
@@ -0,0 +1,115 @@
+"""Instructor-controlled pacing for a cohort of learners.
+
+An instructor opens steps for a whole cohort from the console instead of
+saying "do not click until instructed". Every release is recorded on a
+process-wide :class:`PacingBoard`, and each learner session reads it with
+one dictionary lookup. No lock is taken on reads, because writers swap in a
+new tuple.
+
+Given a progress store (see :mod:`mystery_case.progress`), the board also
+writes releases to that store. A background thread re-reads the releases of
+every cohort it has seen each ``refresh`` seconds, so a release made on one
+worker reaches learners on every worker within one poll. Learner reads are
+served from that copy and never wait on the store; only the first read of a
+cohort in a process loads it directly.
+
+A release is staggered. Every learner gets a fixed offset within the
+release's ``stagger`` window, derived from their token, and the step opens
+for them only once that offset has passed. A class therefore moves on over a
+few seconds instead of sending 60 reruns to the server in the same instant.
+"""
+
+import logging
+import threading
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+
+log = logging.getLogger(__name__)
+
+STAGGER = 10.0  # default seconds over which a release reaches the whole cohort
+POLL_INTERVAL = 2.0  # seconds between gate checks of a waiting learner
+
+
+@dataclass(frozen=True)
+class Release:
+    step: int
+    at: float
+    stagger: float
+
+
+def learner_offset(learner_id: str, stagger: float) -> float:
+    """Where in a ``stagger``-second window the learner's gates open (stable across processes)."""
+    return stagger * zlib.crc32(learner_id.encode()) / 2**32
+
+
+class PacingBoard:
+    def __init__(self, store=None, refresh: float = POLL_INTERVAL):
+        self.store = store
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._cohorts = {}  # cohort -> tuple of Release, ascending by step
+        self._refresher = None
+
+    def _load(self, cohort: str) -> tuple:
+        releases = tuple(Release(**r) for r in self.store.load_releases(cohort))
+        self._cohorts[cohort] = releases
+        return releases
+
+    def _store(self, cohort: str, releases: tuple):
+        if self.store is not None:
+            self.store.save_releases(cohort, [asdict(r) for r in releases])
+        self._cohorts[cohort] = releases
+
+    def _refresh(self):
+        while True:
+            time.sleep(self.refresh)
+            for cohort in list(self._cohorts):
+                try:
+                    with self._lock:  # not across a release() on this worker
+                        self._load(cohort)
+                except Exception:  # keep gating on the last known releases; retry next round
+                    log.exception("reading pacing releases for cohort %s failed", cohort)
+
+    def release(self, cohort: str, step: int, stagger: float = STAGGER, now: float = None) -> Release:
+        """Open every step up to ``step`` for ``cohort``; earlier releases are kept."""
+        entry = Release(step, time.time() if now is None else now, max(0.0, stagger))
+        with self._lock:
+            current = self._cohorts.get(cohort, ()) if self.store is None else self._load(cohort)
+            self._store(cohort, tuple(r for r in current if r.step < step) + (entry,))
+        return entry
+
+    def reset(self, cohort: str):
+        with self._lock:
+            self._store(cohort, ())
+
+    def releases(self, cohort: str) -> tuple:
+        releases = self._cohorts.get(cohort)
+        if releases is not None or self.store is None:
+            return releases or ()
+        with self._lock:  # first read of this cohort: load it, then keep it fresh in the background
+            if cohort not in self._cohorts:
+                try:
+                    self._load(cohort)
+                except Exception:  # gate on no releases until the next refresh
+                    log.exception("reading pacing releases for cohort %s failed", cohort)
+                    self._cohorts[cohort] = ()
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh, name="pacing-refresh", daemon=True)
+                self._refresher.start()
+            return self._cohorts[cohort]
+
+    def open_step(self, cohort: str, learner_id: str, now: float = None) -> int:
+        """Highest step ``learner_id`` may enter now (Step 1 is always open)."""
+        now = time.time() if now is None else now
+        for r in reversed(self.releases(cohort)):
+            if now >= r.at + learner_offset(learner_id, r.stagger):
+                return r.step
+        return 1
+
+
+@lru_cache(maxsize=None)
+def shared_board(store=None) -> PacingBoard:
+    """Return the process-wide :class:`PacingBoard`, backed by ``store`` if given."""
+    return PacingBoard(store)
@@ -0,0 +1,323 @@
+"""Persistent learner progress with write-behind batching.
+
+A learner is identified by an opaque token kept in the page URL
+(``?learner=...``) and progress is saved per learner and case, so reloading
+the page, a dropped websocket or a restarted server all lead back to the same
+:class:`~mystery_case.state.LearnerState`.
+
+The render path never waits on storage: :meth:`WriteBehind.put` only records
+the latest snapshot for a learner in memory (repeated saves coalesce), and a
+background thread writes whatever is pending in one batch every
+``interval`` seconds. Reads check the pending snapshots first, so a learner
+always sees their own latest write.
+
+Backends are chosen by URL (``MYSTERY_CASE_PROGRESS``):
+
+* ``sqlite:///path/to/progress.sqlite3`` (the default, ``sqlite:///progress.sqlite3``)
+* ``redis://host:6379/0`` (or ``rediss://``) for any Redis-compatible server;
+  needs the ``redis`` package
+* ``none`` to keep progress in memory only
+
+With a shared backend, any Streamlit worker can serve any learner. Workers on
+one host can share one SQLite file. Workers on several hosts share one Redis.
+A learner whose connection lands on another worker, for example during a
+rolling deploy, resumes from the store. Only snapshots still pending on the
+old worker are missing, which is at most ``interval`` seconds of progress,
+and a worker that shuts down cleanly flushes those too. Stores also keep
+the instructor's pacing releases (see :mod:`mystery_case.pacing`), so a
+release reaches a cohort on every worker.
+"""
+
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+DEFAULT_URL = "sqlite:///progress.sqlite3"
+FLUSH_INTERVAL = 1.0  # seconds between background batches
+MAX_BATCH = 500  # pending learners that trigger an early flush
+
+
+class SQLiteProgressStore:
+    """Snapshots in one SQLite table; batches are written in one transaction.
+
+    With ``read_only``, the file must already exist and is opened read-only,
+    so a mistyped path fails instead of creating an empty store.
+    """
+
+    def __init__(self, path, read_only: bool = False):
+        self.path = Path(path)
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        if read_only:
+            if not self.path.is_file():
+                raise FileNotFoundError(f"no progress store at {self.path}")
+            self._db = self._connect(check_same_thread=False, isolation_level=None)
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = self._connect(check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS progress ("
+            " learner_id TEXT NOT NULL,"
+            " case_id TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (learner_id, case_id))"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS releases (cohort TEXT PRIMARY KEY, releases TEXT NOT NULL)")
+
+    def _connect(self, **kwargs) -> sqlite3.Connection:
+        if self.read_only:
+            return sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True, **kwargs)
+        return sqlite3.connect(self.path, **kwargs)
+
+    def load(self, learner_id: str, case_id: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state FROM progress WHERE learner_id = ? AND case_id = ?", (learner_id, case_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_many(self, snapshots: dict):
+        """Upsert ``{(learner_id, case_id): snapshot}`` in one transaction."""
+        now = time.time()
+        rows = [(lid, cid, json.dumps(snap), now) for (lid, cid), snap in snapshots.items()]
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT INTO progress (learner_id, case_id, state, updated_at) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(learner_id, case_id) DO UPDATE SET"
+                    " state = excluded.state, updated_at = excluded.updated_at",
+                    rows,
+                )
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def scan(self, batch_size: int = 1000):
+        """Yield ``(learner_id, case_id, updated_at, snapshot)`` for every record.
+
+        Rows are read ``batch_size`` at a time on a cursor of their own, so
+        memory stays bounded however many records the table holds.
+        """
+        db = self._connect()
+        try:
+            cursor = db.execute("SELECT learner_id, case_id, updated_at, state FROM progress ORDER BY updated_at")
+            while rows := cursor.fetchmany(batch_size):
+                for learner_id, case_id, updated_at, state in rows:
+                    yield learner_id, case_id, updated_at, json.loads(state)
+        finally:
+            db.close()
+
+    def load_releases(self, cohort: str) -> list:
+        with self._lock:
+            row = self._db.execute("SELECT releases FROM releases WHERE cohort = ?", (cohort,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def save_releases(self, cohort: str, releases: list):
+        with self._lock:
+            if releases:
+                self._db.execute(
+                    "INSERT INTO releases (cohort, releases) VALUES (?, ?)"
+                    " ON CONFLICT(cohort) DO UPDATE SET releases = excluded.releases",
+                    (cohort, json.dumps(releases)),
+                )
+            else:
+                self._db.execute("DELETE FROM releases WHERE cohort = ?", (cohort,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class RedisProgressStore:
+    """Snapshots in a Redis-compatible server, shared by every worker.
+
+    Each snapshot is one string key, and a sorted set indexes them by update
+    time for :meth:`scan`. A batch is written in one ``MULTI`` transaction.
+    Pacing releases live in one hash, keyed by cohort.
+    """
+
+    PREFIX = "mystery_case:"
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ModuleNotFoundError:
+            raise ModuleNotFoundError("redis:// progress stores need the 'redis' package: pip install redis") from None
+        self._db = redis.Redis.from_url(url)
+        self._index = self.PREFIX + "progress"
+        self._releases = self.PREFIX + "releases"
+
+    def _key(self, member: str) -> str:
+        return f"{self.PREFIX}progress:{member}"
+
+    @staticmethod
+    def _member(learner_id: str, case_id: str) -> str:
+        return json.dumps([learner_id, case_id])  # unambiguous whatever the ids contain
+
+    def load(self, learner_id: str, case_id: str):
+        raw = self._db.get(self._key(self._member(learner_id, case_id)))
+        return json.loads(raw) if raw else None
+
+    def save_many(self, snapshots: dict):
+        """Write ``{(learner_id, case_id): snapshot}`` in one transaction."""
+        now = time.time()
+        pipe = self._db.pipeline(transaction=True)
+        for (lid, cid), snap in snapshots.items():
+            member = self._member(lid, cid)
+            pipe.set(self._key(member), json.dumps(snap))
+            pipe.zadd(self._index, {member: now})
+        pipe.execute()
+
+    def scan(self, batch_size: int = 1000):
+        """Yield ``(learner_id, case_id, updated_at, snapshot)`` for every record, ``batch_size`` keys per round trip.
+
+        The index is walked with ``ZSCAN``, not by rank: saves during the scan
+        change scores and would shift ranks, skipping records. ``ZSCAN``
+        returns every record that exists for the whole scan, in no particular
+        order, and each with its latest snapshot.
+        """
+        cursor = None
+        while cursor != 0:
+            cursor, page = self._db.zscan(self._index, cursor or 0, count=batch_size)
+            if not page:  # ZSCAN may return an empty page before the end
+                continue
+            members = [member.decode() for member, _ in page]
+            for member, (_, updated_at), raw in zip(members, page, self._db.mget([self._key(m) for m in members])):
+                if raw is not None:
+                    learner_id, case_id = json.loads(member)
+                    yield learner_id, case_id, updated_at, json.loads(raw)
+
+    def load_releases(self, cohort: str) -> list:
+        raw = self._db.hget(self._releases, cohort)
+        return json.loads(raw) if raw else []
+
+    def save_releases(self, cohort: str, releases: list):
+        if releases:
+            self._db.hset(self._releases, cohort, json.dumps(releases))
+        else:
+            self._db.hdel(self._releases, cohort)
+
+    def close(self):
+        self._db.close()
+
+
+class MemoryProgressStore:
+    """Process-local store: progress survives reconnects but not restarts."""
+
+    def __init__(self):
+        self._data = {}
+        self._releases = {}
+
+    def load(self, learner_id: str, case_id: str):
+        return self._data.get((learner_id, case_id))
+
+    def save_many(self, snapshots: dict):
+        self._data.update(snapshots)
+
+    def scan(self, batch_size: int = 1000):
+        for (learner_id, case_id), snapshot in list(self._data.items()):
+            yield learner_id, case_id, None, snapshot
+
+    def load_releases(self, cohort: str) -> list:
+        return self._releases.get(cohort, [])
+
+    def save_releases(self, cohort: str, releases: list):
+        if releases:
+            self._releases[cohort] = list(releases)
+        else:
+            self._releases.pop(cohort, None)
+
+    def close(self):
+        pass
+
+
+def open_store(url: str, read_only: bool = False):
+    """Return the progress backend for ``url`` (see the module docstring).
+
+    ``read_only`` opens an existing SQLite file read-only, for tools that
+    only read the store; it raises :class:`FileNotFoundError` if there is none.
+    """
+    if url in ("", "none", "memory"):
+        return MemoryProgressStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteProgressStore(url[len("sqlite:///"):], read_only=read_only)
+    if url.startswith(("redis://", "rediss://")):
+        return RedisProgressStore(url)
+    raise ValueError(f"unsupported progress store URL {url!r}")
+
+
+class WriteBehind:
+    """Coalescing, batching writer in front of a progress backend."""
+
+    def __init__(self, store, interval: float = FLUSH_INTERVAL, max_batch: int = MAX_BATCH):
+        self.store = store
+        self.interval = interval
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}  # (learner_id, case_id) -> latest snapshot not yet written
+        self._batches = 0
+        self._written = 0
+        self._thread = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, learner_id: str, snapshot: dict):
+        with self._lock:
+            self._pending[learner_id, snapshot["case_id"]] = snapshot
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def get(self, learner_id: str, case_id: str):
+        with self._lock:
+            snapshot = self._pending.get((learner_id, case_id))
+        return snapshot if snapshot is not None else self.store.load(learner_id, case_id)
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        try:
+            self.store.save_many(batch)
+        except Exception:
+            log.exception("saving progress for %d learner(s) failed; will retry", len(batch))
+            with self._lock:  # keep newer snapshots that arrived meanwhile
+                self._pending = {**batch, **self._pending}
+            return
+        with self._lock:
+            self._batches += 1
+            self._written += len(batch)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._pending), "batches": self._batches, "written": self._written}
+
+
+@lru_cache(maxsize=None)
+def shared_progress(url: str = DEFAULT_URL) -> WriteBehind:
+    """Return the process-wide :class:`WriteBehind` for ``url``.
+
+    Pending progress is flushed once more when the process exits.
+    """
+    writer = WriteBehind(open_store(url))
+    atexit.register(writer.flush)
+    return writer
@@ -0,0 +1,187 @@
+"""Downloadable end-of-case report, built off the script thread.
+
+:func:`build_report` renders a learner's answers to every step, next to the
+case's teaching notes, as one self-contained HTML page. The page prints
+cleanly to PDF from any browser, so no PDF library is needed on the server.
+
+:class:`ReportBuilder` runs the builds on a small thread pool and keeps the
+results keyed by a hash of the case and the learner's answers. The Streamlit
+script thread only submits a build and checks whether it is done, so it
+never waits on one. Repeated clicks, reruns and learners with identical
+answers all reuse the same build.
+"""
+
+import hashlib
+import html
+import json
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+WORKERS = 2
+CACHE_SIZE = 256  # finished reports kept
+
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_ITALIC = re.compile(r"\*(.+?)\*")
+
+STYLE = """
+body { font-family: -apple-system, "Segoe UI", Roboto, sans-serif; max-width: 48rem; margin: 2rem auto; color: #1f2933; }
+h1 { font-size: 1.5rem; } h2 { font-size: 1.15rem; margin-top: 1.6rem; border-bottom: 1px solid #d9dee4; }
+dt { font-weight: 600; margin-top: .5rem; } dd { margin: .1rem 0 0 1rem; }
+.notes { background: #f4f7fb; padding: .2rem 1rem; border-radius: 6px; }
+.muted { color: #6b7785; } .no { color: #b42318; }
+"""
+
+
+def _inline(text: str) -> str:
+    text = html.escape(text)
+    return _ITALIC.sub(r"<em>\1</em>", _BOLD.sub(r"<strong>\1</strong>", text))
+
+
+def markdown_to_html(text: str) -> str:
+    """The Markdown subset the case files use: paragraphs, ``-`` bullets, bold and italics."""
+    out, items = [], []
+    for block in text.strip().split("\n\n"):
+        for line in block.splitlines():
+            if line.lstrip().startswith("- "):
+                items.append(f"<li>{_inline(line.lstrip()[2:])}</li>")
+                continue
+            if items:
+                out.append("<ul>" + "".join(items) + "</ul>")
+                items = []
+            if line.strip():
+                out.append(f"<p>{_inline(line.strip())}</p>")
+        if items:
+            out.append("<ul>" + "".join(items) + "</ul>")
+            items = []
+    return "\n".join(out)
+
+
+def _answers(pairs) -> str:
+    rows = "".join(
+        f"<dt>{html.escape(label)}</dt><dd>{_inline(value) if value else '<span class=muted>No answer</span>'}</dd>"
+        for label, value in pairs
+    )
+    return f"<dl>{rows}</dl>"
+
+
+def _labs(labs, mask: int) -> str:
+    ordered = [lab["label"] for i, lab in enumerate(labs) if mask >> i & 1]
+    return ", ".join(ordered) if ordered else ""
+
+
+def _notes(case, step_key: str) -> str:
+    notes = case["teaching"].get(step_key)
+    if not notes:
+        return ""
+    update = f"<p>{_inline(notes['update'])}</p>" if "update" in notes else ""
+    return f"{update}<div class=notes>{markdown_to_html(notes['notes'])}</div>"
+
+
+def build_report(case, snapshot: dict) -> bytes:
+    """The HTML report for one learner (``snapshot`` is ``LearnerState.to_dict()``)."""
+    s = snapshot
+    oi = case["tb"]["oi_tests"]
+    oi_items = "".join(
+        f"<li>{html.escape(oi[k]['label'])}"
+        + ("" if oi[k]["reasonable"] else " <span class=no>(not needed here)</span>")
+        + "</li>"
+        for k in s.get("step8_oi_selected", ())
+        if k in oi
+    )
+    sections = [
+        (
+            "Step 2 — Initial clinical reasoning",
+            _answers(
+                [
+                    ("Clinical syndrome", s["clinical_syndrome"]),
+                    ("Likely pathogens", s["likely_pathogen"]),
+                    ("Diagnostic tests", s["diagnostic_tests"]),
+                ]
+            ),
+        ),
+        ("Step 3 — Laboratory results", _answers([("Diagnosis after labs", s["diagnosis_first"])]) + _notes(case, "step3")),
+        (
+            "Step 4 — Three months later",
+            _answers([("First step", s["step4_choice"]), ("LP interpretation", s["lp_interpretation"])]),
+        ),
+        (
+            "Step 5 — Final questions after CSF",
+            _answers(
+                [
+                    ("Clinical syndrome", s["step5_clinical_syndrome"]),
+                    ("Likely pathogen", s["step5_likely_pathogen"]),
+                    ("Confirmatory test", s["step5_confirmatory_test"]),
+                ]
+            )
+            + _notes(case, "step5"),
+        ),
+        ("Step 6 — Bloody diarrhea after travel", _answers([("First action", s["diarrhea_choice"])]) + _notes(case, "step6")),
+        (
+            "Step 7 — Fever after travel",
+            _answers([("Labs ordered", _labs(case["fever"]["labs"], s["step7_labs"])), ("Most likely diagnosis", s["step7_dx"])])
+            + _notes(case, "step7"),
+        ),
+        (
+            "Step 8 — Advanced HIV / disseminated TB",
+            _answers([("Labs ordered", _labs(case["tb"]["labs"], s["step8_labs"])), ("Most likely diagnosis", s["step8_dx"])])
+            + (f"<p><strong>Additional OI tests selected:</strong></p><ul>{oi_items}</ul>" if oi_items else "")
+            + _notes(case, "step8"),
+        ),
+    ]
+    body = "\n".join(f"<h2>{html.escape(title)}</h2>\n{content}" for title, content in sections)
+    page = (
+        "<!doctype html><html><head><meta charset=utf-8>"
+        f"<title>{html.escape(case['title'])} — case report</title><style>{STYLE}</style></head><body>"
+        f"<h1>{html.escape(case['title'])}</h1>"
+        f"<p class=muted>Case report generated {datetime.now():%Y-%m-%d %H:%M}. "
+        "Use your browser's Print → Save as PDF for a PDF copy.</p>"
+        f"{body}</body></html>"
+    )
+    return page.encode("utf-8")
+
+
+def report_key(case, snapshot: dict) -> str:
+    """Hash of the case revision and the learner's answers (the one-shot flash is not part of a snapshot)."""
+    payload = json.dumps([case["id"], case["revision"], snapshot], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ReportBuilder:
+    def __init__(self, workers: int = WORKERS, capacity: int = CACHE_SIZE):
+        self.capacity = capacity
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="case-report")
+        self._lock = threading.Lock()
+        self._futures = OrderedDict()  # report_key -> Future, least recently used first
+        self._builds = 0
+
+    def request(self, case, snapshot: dict, retry: bool = False):
+        """Return the (possibly finished) Future for this report, starting a build if needed.
+
+        A failed build stays cached, so every rerun shows the failure instead
+        of starting another build; ``retry`` (an explicit action) rebuilds it.
+        """
+        key = report_key(case, snapshot)
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None and not (retry and future.done() and future.exception() is not None):
+                self._futures.move_to_end(key)
+                return future
+            future = self._futures[key] = self._pool.submit(build_report, case, snapshot)
+            self._builds += 1
+            while len(self._futures) > self.capacity:
+                self._futures.popitem(last=False)
+            return future
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cached": len(self._futures), "builds": self._builds}
+
+
+@lru_cache(maxsize=None)
+def shared_reports() -> ReportBuilder:
+    """Return the process-wide :class:`ReportBuilder`."""
+    return ReportBuilder()
@@ -0,0 +1,214 @@
+"""Per-session memory accounting for sizing deployments.
+
+Every full script run registers its session with the process-wide
+:class:`SessionRegistry` (a dictionary update, nothing is measured then). An
+entry is keyed by session id and holds that session's ``SessionState``, which
+lives as long as the session does. It does not hold the ``SafeSessionState``
+wrapper, which Streamlit creates anew for every script run. Liveness comes
+from the running server's session manager: a session that Streamlit closes
+after its learner disconnects is dropped by the next snapshot, or by the
+next :meth:`~SessionRegistry.touch` once ``prune_interval`` seconds have
+passed, so closed sessions are released even if nobody ever looks.
+
+:meth:`SessionRegistry.snapshot` walks the live sessions on demand and returns
+a JSON-serialisable report: per-session bytes (learner state and widget
+values, which is where typed answers live until saved), age and idle time,
+aggregates, and whatever shared caches the caller passes in. The app shows it
+on an admin-only view and can log it periodically as one JSON line.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+
+log = logging.getLogger(__name__)
+
+PRUNE_INTERVAL = 60.0  # seconds between sweeps for closed sessions on the write path
+
+
+def deep_sizeof(obj, seen=None) -> int:
+    """Approximate bytes reachable from ``obj``; shared objects count once."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, (dict, MappingProxyType)):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(v, seen) for v in obj)
+    if hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    for name in getattr(type(obj), "__slots__", ()):
+        size += deep_sizeof(getattr(obj, name, None), seen)
+    return size
+
+
+def rss_bytes():
+    """Resident set size of this process, or ``None`` where unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def runtime_session_alive(session_id: str):
+    """Whether the running Streamlit server still holds ``session_id``; ``None`` if there is no server to ask."""
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.session_manager import SessionManager
+
+    if not Runtime.exists():
+        return None
+    manager = getattr(Runtime.instance(), "_session_mgr", None)
+    if not isinstance(manager, SessionManager):  # e.g. AppTest's stand-in runtime
+        return None
+    return manager.get_session_info(session_id) is not None
+
+
+@dataclass
+class _Session:
+    state: object  # the session's SessionState
+    case_id: str
+    started: float
+    last_seen: float
+    runs: int = 0
+
+
+def _items(state, attempts: int = 3):
+    # The SessionState itself takes no lock; a rerun on the session's own
+    # thread can change it while this copies it, so retry a few times.
+    for _ in range(attempts):
+        try:
+            return dict(state.filtered_state)
+        except RuntimeError:
+            continue
+    return None
+
+
+class SessionRegistry:
+    def __init__(self, is_alive=runtime_session_alive, prune_interval: float = PRUNE_INTERVAL):
+        self.is_alive = is_alive  # session_id -> True/False, or None when it cannot tell
+        self.prune_interval = prune_interval
+        self._lock = threading.Lock()
+        self._sessions = {}  # session_id -> _Session
+        self._pruned = time.monotonic()
+
+    def touch(self, session_id: str, state, case_id: str):
+        """Record a full script run of ``session_id``.
+
+        ``state`` is the session's ``SessionState``; a ``SafeSessionState``
+        (``ctx.session_state``) is unwrapped to the one it guards.
+        """
+        state = getattr(state, "_state", state)
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry.state is not state:
+                entry = self._sessions[session_id] = _Session(state, case_id, now, now)
+            entry.case_id = case_id
+            entry.last_seen = now
+            entry.runs += 1
+            prune = time.monotonic() - self._pruned >= self.prune_interval
+            if prune:
+                self._pruned = time.monotonic()
+        if prune:
+            self._live()
+
+    def _live(self):
+        with self._lock:
+            sessions = list(self._sessions.items())
+        closed = [k for k, _ in sessions if self.is_alive(k) is False]
+        if closed:
+            with self._lock:
+                for session_id in closed:
+                    self._sessions.pop(session_id, None)
+        return [(k, e, e.state) for k, e in sessions if k not in closed]
+
+    def __len__(self) -> int:
+        return len(self._live())
+
+    def snapshot(self, shared=None) -> dict:
+        """Measure every live session now; ``shared`` maps cache names to byte counts."""
+        now = time.time()
+        sessions = []
+        for session_id, entry, state in self._live():
+            items = _items(state)
+            if items is None:
+                continue
+            learner = items.pop("learner", None)
+            sessions.append(
+                {
+                    "session_id": session_id,
+                    "case_id": entry.case_id,
+                    "age_s": round(now - entry.started, 1),
+                    "idle_s": round(now - entry.last_seen, 1),
+                    "runs": entry.runs,
+                    "keys": len(items) + (learner is not None),
+                    "learner_bytes": deep_sizeof(learner),
+                    "widget_bytes": deep_sizeof(items),
+                }
+            )
+            sessions[-1]["total_bytes"] = sessions[-1]["learner_bytes"] + sessions[-1]["widget_bytes"]
+        sessions.sort(key=lambda s: s["total_bytes"], reverse=True)
+
+        totals = [s["total_bytes"] for s in sessions]
+        shared = dict(shared or {})
+        return {
+            "time": now,
+            "sessions": sessions,
+            "aggregate": {
+                "count": len(sessions),
+                "session_bytes": sum(totals),
+                "mean_session_bytes": round(sum(totals) / len(totals)) if totals else 0,
+                "max_session_bytes": max(totals, default=0),
+                "oldest_s": max((s["age_s"] for s in sessions), default=0),
+            },
+            "shared": shared,
+            "rss_bytes": rss_bytes(),
+        }
+
+
+def log_snapshots(registry: SessionRegistry, interval: float, shared=None):
+    """Log ``registry.snapshot()`` as one JSON line every ``interval`` seconds.
+
+    ``shared`` is a zero-argument callable returning the shared-cache sizes.
+    Runs in a daemon thread; returns the thread.
+    """
+    if not log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+        log.propagate = False
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                report = registry.snapshot(shared() if shared else None)
+            except Exception:  # never let accounting take the app down
+                log.exception("session snapshot failed")
+                continue
+            report.pop("sessions")
+            log.info("session_stats %s", json.dumps(report, sort_keys=True))
+
+    thread = threading.Thread(target=run, name="session-stats", daemon=True)
+    thread.start()
+    return thread
+
+
+@lru_cache(maxsize=None)
+def shared_registry() -> SessionRegistry:
+    """Return the process-wide :class:`SessionRegistry`."""
+    return SessionRegistry()
@@ -0,0 +1,141 @@
+"""Per-learner progress as one compact, typed object.
+
+Everything a learner has done in a case lives in a single slotted
+:class:`LearnerState` stored under ``st.session_state.learner``, instead of
+~30 loose session-state keys. Yes/no progress (envelopes opened, teaching
+notes unlocked, ...) is packed into one :class:`Flag` integer and revealed
+labs into one bitmask per lab panel, where bit ``i`` is the ``i``-th lab of
+that panel in the case file. Free-text answers are plain string fields.
+
+Resetting a case is replacing the object, whatever the learner has done.
+:meth:`LearnerState.to_dict` / :meth:`LearnerState.from_dict` give the
+JSON-friendly form used by the progress store.
+
+Lab bitmasks are positional, so a state records the case ``revision`` they
+refer to. A snapshot also lists the revealed labs by key. When the case file
+changes, :meth:`LearnerState.rebase` maps the labs to the new order by key.
+It drops labs and OI tests the case no longer has, so an edit never shows a
+learner labs they did not order.
+"""
+
+import enum
+from dataclasses import dataclass, field, fields
+
+STATE_VERSION = 1  # bump when a field changes meaning, not when one is added
+LAB_PANELS = {"step7_labs": "fever", "step8_labs": "tb"}  # bitmask field -> lab panel of the case
+
+
+class Flag(enum.IntFlag):
+    VIEWED_VITALS = enum.auto()
+    VIEWED_HISTORY = enum.auto()
+    VIEWED_EXAM = enum.auto()
+    STEP3_TEACHING = enum.auto()
+    LP_REVEALED = enum.auto()
+    STEP5_TEACHING = enum.auto()
+    STEP6_CORRECT = enum.auto()
+    STEP7_TEACHING = enum.auto()
+    STEP8_READY = enum.auto()
+    STEP8_TEACHING = enum.auto()
+    SHOW_ALL_ANSWERS = enum.auto()
+
+    NONE = 0
+    VIEWED_ALL = VIEWED_VITALS | VIEWED_HISTORY | VIEWED_EXAM
+
+
+@dataclass(slots=True)
+class LearnerState:
+    case_id: str
+    # Bumped on reset and used to namespace widget keys, so the new attempt
+    # starts with empty widgets and Streamlit drops the old widget state.
+    epoch: int = 0
+    step: int = 1  # 1 → 2 → 3 → 4 → 5 → 6 → 7 → 8
+    revision: str = ""  # case revision the lab bitmasks refer to
+    flags: Flag = Flag.NONE
+    step7_labs: int = 0  # bitmask over CASE["fever"]["labs"]
+    step8_labs: int = 0  # bitmask over CASE["tb"]["labs"]
+
+    # Step 2–3
+    clinical_syndrome: str = ""
+    likely_pathogen: str = ""
+    diagnostic_tests: str = ""
+    diagnosis_first: str = ""
+    # Step 4–5
+    step4_choice: str = ""
+    lp_interpretation: str = ""
+    step5_clinical_syndrome: str = ""
+    step5_likely_pathogen: str = ""
+    step5_confirmatory_test: str = ""
+    # Step 6–8
+    diarrhea_choice: str = ""
+    step7_dx: str = ""
+    step8_dx: str = ""
+    step8_oi_selected: tuple = ()
+
+    # One-shot (step, kind, text) message left by a button callback; not
+    # progress, so it is neither compared nor saved
+    flash: tuple = field(default=None, repr=False, compare=False)
+
+    def has(self, flag: Flag) -> bool:
+        return self.flags & flag == flag
+
+    def set(self, flag: Flag, on: bool = True):
+        self.flags = self.flags | flag if on else self.flags & ~flag
+
+    def revealed(self, group: str, index: int) -> bool:
+        return bool(getattr(self, group) >> index & 1)
+
+    def reveal(self, group: str, index: int):
+        setattr(self, group, getattr(self, group) | 1 << index)
+
+    def reset(self) -> "LearnerState":
+        """Return a fresh state for the same case."""
+        return LearnerState(self.case_id, epoch=self.epoch + 1)
+
+    def lab_keys(self, case) -> dict:
+        """The revealed labs of each panel by key (``case`` must be at :attr:`revision`)."""
+        return {
+            group: [lab["key"] for i, lab in enumerate(case[panel]["labs"]) if self.revealed(group, i)]
+            for group, panel in LAB_PANELS.items()
+        }
+
+    def rebase(self, case, lab_keys: dict = None):
+        """Make the state refer to ``case``'s current revision.
+
+        ``lab_keys`` are the revealed labs by key as of :attr:`revision` (from
+        a snapshot); without them, revealed labs cannot be mapped and are
+        cleared. OI tests the case does not have are always dropped.
+        """
+        oi_tests = case["tb"]["oi_tests"]
+        self.step8_oi_selected = tuple(k for k in self.step8_oi_selected if k in oi_tests)
+        if self.revision == case["revision"]:
+            return
+        for group, panel in LAB_PANELS.items():
+            keys = set((lab_keys or {}).get(group, ()))
+            setattr(self, group, sum(1 << i for i, lab in enumerate(case[panel]["labs"]) if lab["key"] in keys))
+        self.revision = case["revision"]
+
+    def to_dict(self, case=None) -> dict:
+        """JSON-friendly snapshot; with ``case``, it also lists the revealed labs by key."""
+        data = {f.name: getattr(self, f.name) for f in fields(self) if f.compare}
+        data["flags"] = int(self.flags)
+        data["step8_oi_selected"] = list(self.step8_oi_selected)
+        if case is not None:
+            data["lab_keys"] = self.lab_keys(case)
+        data["version"] = STATE_VERSION
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict, case=None) -> "LearnerState":
+        """Rebuild a state saved by :meth:`to_dict`; unknown keys are ignored.
+
+        With ``case``, the state is rebased onto its current revision.
+        """
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"unsupported learner state version {data.get('version')!r}")
+        known = {f.name for f in fields(cls) if f.compare}
+        state = cls(**{k: v for k, v in data.items() if k in known})
+        state.flags = Flag(state.flags)
+        state.step8_oi_selected = tuple(state.step8_oi_selected)
+        if case is not None:
+            state.rebase(case, data.get("lab_keys"))
+        return state
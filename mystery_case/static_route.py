@@ -0,0 +1,70 @@
+"""HTTP-cacheable URLs for case images.
+
+``st.image`` given bytes stores them in Streamlit's per-session media
+manager. Every session then gets its own short-lived URL, so a browser, or a
+classroom proxy, can cache nothing across reruns, sessions or learners.
+
+:func:`asset_routes` adds one route, ``/app/static/case-assets/<file>``, that
+serves the pre-built derivatives from ``python -m mystery_case.build_assets``
+under their content-hashed file names (``vignette-ed68d65a1531.jpg``).
+Responses carry a strong ``ETag`` and ``Cache-Control: immutable`` with a
+one-year lifetime, and the route answers ``If-None-Match`` with ``304``.
+Bytes come from the shared :class:`~mystery_case.images.ImageStore`, not from
+disk on every request. A changed image gets a new file name and so a new URL.
+
+The route is mounted by ``serve.py`` (``streamlit run serve.py``). The prefix
+is one that ``st.image`` hands to the browser untouched. Without the route or
+a build manifest, :func:`asset_url` returns ``None`` and the app sends image
+bytes as before.
+"""
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from mystery_case.images import shared_store
+
+ROUTE_PREFIX = "/app/static/case-assets/"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+MEDIA_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png"}
+
+
+def built_files(store) -> dict:
+    """Derivative file name -> (source filename, sha256, format) for every built image."""
+    if store.manifest is None:
+        return {}
+    return {
+        entry["derivative"]["file"]: (filename, entry["derivative"]["sha256"], entry["derivative"]["format"])
+        for filename, entry in store.manifest["images"].items()
+        if entry is not None and not store.stale(filename)
+    }
+
+
+def asset_url(store, filename):
+    """The cacheable URL of ``filename``'s derivative, or ``None`` if it was not built (or the build is stale)."""
+    if store.manifest is None or not filename or store.stale(filename):
+        return None
+    entry = store.manifest["images"].get(filename)
+    return ROUTE_PREFIX + entry["derivative"]["file"] if entry else None
+
+
+def asset_routes(assets_dir) -> list:
+    store = shared_store(assets_dir)
+    files = built_files(store)
+
+    async def case_asset(request: Request) -> Response:
+        found = files.get(request.path_params["name"])
+        if found is None:
+            return Response(status_code=404)
+        filename, sha256, fmt = found
+        if store.stale(filename):  # the bytes would not match the ETag
+            return Response(status_code=404)
+        headers = {"ETag": f'"{sha256}"', "Cache-Control": CACHE_CONTROL}
+        if headers["ETag"] in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        data = store.get(filename)
+        if data is None or store.stale(filename):  # the built file went missing just now; data is re-encoded
+            return Response(status_code=404)
+        return Response(data, media_type=MEDIA_TYPES.get(fmt, "application/octet-stream"), headers=headers)
+
+    return [Route(ROUTE_PREFIX + "{name}", case_asset, methods=["GET", "HEAD"])]
@@ -0,0 +1,67 @@
+"""Per-step background colours: one stylesheet per case and a class per step.
+
+The app used to send a new ``<style>`` block with the current step's colour on
+every pass, so the browser re-parsed and re-applied CSS each time.
+:func:`stylesheet` now renders one stylesheet with a rule for every step. It
+keys each rule on a marker class (``mc-step-N``) being present on the page,
+using CSS ``:has()``. A rerun re-sends the same stylesheet element byte for
+byte, and the frontend leaves it alone. Moving to another step only changes
+the tiny marker from :func:`step_marker`.
+
+A case can override any step colour in its file::
+
+    "theme": {"backgrounds": {"6": "#FFF1E0"}}
+
+Colours must be ``#RRGGBB``: the sidebar uses the same colour at 20% opacity.
+"""
+
+from functools import lru_cache
+from types import MappingProxyType
+
+DEFAULT_BACKGROUNDS = MappingProxyType(
+    {
+        1: "#F9FAFB",  # NEJM light grey
+        2: "#FFF7F2",  # Stanford sandstone
+        3: "#F4F7FB",  # medical blue-grey
+        4: "#FFF9F5",  # NEJM off-white
+        5: "#F2F6FA",  # blue-tinted
+        6: "#FFF5ED",  # travel warm
+        7: "#FDF3F2",  # pale clay
+        8: "#F3FAF5",  # TB green
+    }
+)
+
+_AREAS = (
+    "",
+    " body",
+    ' [data-testid="stAppViewContainer"]',
+    ' [data-testid="stAppViewContainer"] > .main',
+    ' [data-testid="stAppViewContainer"] > .main > div',
+)
+
+
+def backgrounds(case) -> tuple:
+    """``(step, colour)`` pairs for ``case``: the defaults with the case's overrides."""
+    merged = dict(DEFAULT_BACKGROUNDS)
+    for step, colour in case.get("theme", {}).get("backgrounds", {}).items():
+        merged[int(step)] = colour
+    return tuple(sorted(merged.items()))
+
+
+@lru_cache(maxsize=64)
+def stylesheet(step_backgrounds: tuple) -> str:
+    """The whole theme as one ``<style>`` block (cached per colour scheme)."""
+    rules = [".stElementContainer:has(.mc-step), .stElementContainer:has(style.mc-theme) { display: none; }"]
+    for step, colour in step_backgrounds:
+        scope = f"html:has(.mc-step-{step})"
+        rules.append(f"{', '.join(scope + area for area in _AREAS)} {{ background-color: {colour} !important; }}")
+        rules.append(f'{scope} [data-testid="stSidebar"] {{ background-color: {colour}33 !important; }}')
+    return '<style class="mc-theme">\n' + "\n".join(rules) + "\n</style>"
+
+
+def case_stylesheet(case) -> str:
+    return stylesheet(backgrounds(case))
+
+
+def step_marker(step: int) -> str:
+    return f'<span class="mc-step mc-step-{step}"></span>'
@@ -0,0 +1,70 @@
+"""Opt-in hot-path timing for the step renderers.
+
+A process-wide :class:`Timings` keeps the most recent samples of every named
+section (a step renderer, or a block inside one) across all sessions, so the
+percentiles show what a whole class is paying, e.g. when a lecture hall hits
+"Case Continues" at once. Nothing is recorded unless profiling is switched on;
+see ``app.py`` for how.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+SAMPLES = 2048  # most recent samples kept per section
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values, p: float) -> float:
+    """Nearest-rank percentile of an already sorted, non-empty sequence."""
+    rank = max(1, -(-len(sorted_values) * p // 100))  # ceil
+    return sorted_values[int(rank) - 1]
+
+
+class Timings:
+    def __init__(self, samples: int = SAMPLES):
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._sections = {}  # name -> deque of seconds, in first-seen order
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            samples = self._sections.get(name)
+            if samples is None:
+                samples = self._sections[name] = deque(maxlen=self.samples)
+            samples.append(seconds)
+
+    @contextmanager
+    def section(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self) -> list:
+        """One row per section: sample count and percentiles/max in milliseconds."""
+        with self._lock:
+            sections = {name: sorted(samples) for name, samples in self._sections.items()}
+        rows = []
+        for name, values in sections.items():
+            if not values:
+                continue
+            row = {"section": name, "n": len(values)}
+            for p in PERCENTILES:
+                row[f"p{p}_ms"] = round(percentile(values, p) * 1000, 2)
+            row["max_ms"] = round(values[-1] * 1000, 2)
+            rows.append(row)
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._sections.clear()
+
+
+@lru_cache(maxsize=None)
+def shared_timings() -> Timings:
+    """Return the process-wide :class:`Timings`."""
+    return Timings()
@@ -0,0 +1,149 @@
+"""Server warm-up, and the readiness probe that waits for it.
+
+Every process-wide cache in this package fills on first use. A pod started
+right before a lecture used to hand its first wave of learners a cold
+process. Their first clicks paid, all at once, for:
+
+* parsing the case
+* importing pandas and pyarrow and building the tables
+* decoding the images
+
+:class:`Warmup` fills these caches on a background thread when the server
+starts. It covers every case in the catalogue, up to the library's capacity,
+since more cases would only evict each other. For each case it walks
+everything the steps render (:func:`warm_case`):
+
+* the case file (the library)
+* its text blocks and its Arrow tables (:mod:`mystery_case.blocks`)
+* its stylesheet (:mod:`mystery_case.theme`)
+* its image derivatives (the image store)
+
+Reports are not warmed: they are keyed by a learner's answers, so no build
+ahead of time would be reused.
+
+It then imports the modules ``st.image`` loads on first use. It does not
+execute ``app.py`` itself, because Streamlit's script test harness would
+replace the running server's runtime.
+
+:func:`probe_routes` adds ``/ready`` for ``serve.py``. It answers ``503``
+until the warm-up has finished and ``200`` after, each with a JSON status.
+A case or module that failed to warm is logged and listed under ``errors``;
+the warm-up still finishes, so a broken case cannot keep the pod unready.
+Point the load balancer's readiness check at it. Streamlit's own
+``/_stcore/health`` remains the liveness check.
+"""
+
+import importlib
+import logging
+import threading
+import time
+from functools import lru_cache
+
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from mystery_case.blocks import static_blocks, static_tables
+from mystery_case.cases import shared_library
+from mystery_case.images import shared_store
+from mystery_case.theme import case_stylesheet
+
+log = logging.getLogger(__name__)
+
+READY_PATH = "/ready"
+PRELOAD_MODULES = ("numpy", "PIL.Image")  # imported by st.image on first use
+
+
+def warm_case(case, store) -> None:
+    """Fill the process-wide caches a pass over ``case``'s steps reads from."""
+    static_blocks(case)
+    static_tables(case)
+    case_stylesheet(case)
+    store.warm(list(case["images"].values()))
+
+
+class Warmup:
+    def __init__(self, library, store):
+        self.library = library
+        self.store = store
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started = None
+        self._finished = None
+        self._warmed = []  # case ids
+        self._modules = []  # names from PRELOAD_MODULES
+        self._errors = {}  # case id or module name -> message
+
+    def start(self) -> "Warmup":
+        """Run the warm-up on a background thread (once; later calls do nothing)."""
+        with self._lock:
+            if self._thread is None:
+                self._started = time.monotonic()
+                self._thread = threading.Thread(target=self.run, name="server-warm-up", daemon=True)
+                self._thread.start()
+        return self
+
+    def run(self) -> None:
+        # A step that fails is logged and reported, not retried: a case that
+        # fails would fail for learners too, and neither must hold the whole
+        # pod out of rotation. The warm-up always finishes.
+        with self._lock:
+            if self._started is None:  # run() called directly, not from start()
+                self._started = time.monotonic()
+        try:
+            for case_id in list(self.library.index)[: self.library.capacity]:
+                self._step(self._warmed, case_id, lambda: warm_case(self.library.get(case_id), self.store))
+            for name in PRELOAD_MODULES:
+                self._step(self._modules, name, lambda: importlib.import_module(name))
+        except Exception as exc:
+            log.exception("warm-up failed")
+            with self._lock:
+                self._errors["warm-up"] = str(exc)
+        finally:
+            with self._lock:
+                self._finished = time.monotonic()
+            log.info(
+                "warm-up finished in %.2fs (%d case(s), %d error(s))",
+                self._finished - self._started,
+                len(self._warmed),
+                len(self._errors),
+            )
+
+    def _step(self, done: list, name: str, warm) -> None:
+        try:
+            warm()
+        except Exception as exc:
+            log.exception("warm-up of %s failed", name)
+            with self._lock:
+                self._errors[name] = f"{type(exc).__name__}: {exc}"
+        else:
+            with self._lock:
+                done.append(name)
+
+    @property
+    def ready(self) -> bool:
+        return self._finished is not None
+
+    def status(self) -> dict:
+        with self._lock:
+            started, finished = self._started, self._finished
+            return {
+                "ready": finished is not None,
+                "cases": list(self._warmed),
+                "modules": list(self._modules),
+                "errors": dict(self._errors),
+                "seconds": None if started is None else round((finished or time.monotonic()) - started, 2),
+            }
+
+
+@lru_cache(maxsize=None)
+def shared_warmup(assets_dir) -> Warmup:
+    """Return the process-wide :class:`Warmup` for the case library and ``assets_dir``."""
+    return Warmup(shared_library(), shared_store(assets_dir))
+
+
+def probe_routes(warmup: Warmup) -> list:
+    async def ready(request):
+        status = warmup.status()
+        return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+    return [Route(READY_PATH, ready, methods=["GET", "HEAD"])]
@@ -0,0 +1,31 @@
+# Production entry point: `streamlit run serve.py` (or any ASGI server: `uvicorn serve:app`)
+# ======================================================================================
+# Runs app.py unchanged, plus:
+# • an HTTP route that serves the pre-built case images under content-hashed, long-lived
+#   cacheable URLs (see mystery_case/static_route.py), so browsers and a classroom proxy fetch
+#   each image once. Build the images first: python -m mystery_case.build_assets
+# • a warm-up of every case's caches on server start, and GET /ready that answers 503 until it
+#   has finished (see mystery_case/warmup.py); use it as the load balancer's readiness check
+
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from streamlit.starlette import App
+
+from mystery_case.static_route import asset_routes
+from mystery_case.warmup import probe_routes, shared_warmup
+
+os.environ.setdefault("MYSTERY_CASE_ASSET_ROUTE", "1")
+
+ASSETS_DIR = Path("assets")
+WARMUP = shared_warmup(ASSETS_DIR)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    WARMUP.start()
+    yield
+
+
+app = App("app.py", lifespan=lifespan, routes=asset_routes(ASSETS_DIR) + probe_routes(WARMUP))
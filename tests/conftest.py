@@ -0,0 +1,23 @@
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+os.environ.setdefault("MYSTERY_CASE_PROGRESS", "none")
+
+from mystery_case import build_assets  # noqa: E402
+from mystery_case.images import BUILD_DIR  # noqa: E402
+
+
+@pytest.fixture
+def built_assets(tmp_path):
+    """A copy of the source images with derivatives and a manifest built afresh."""
+    root = tmp_path / "assets"
+    shutil.copytree(ROOT / "assets", root, ignore=shutil.ignore_patterns(BUILD_DIR))
+    build_assets.build(root)
+    return root
@@ -0,0 +1,35 @@
+from mystery_case.analytics import CohortAnalytics, answers
+from mystery_case.cases import shared_library
+from mystery_case.state import LearnerState
+
+
+def _case():
+    library = shared_library()
+    return library.get(library.default_id)
+
+
+def test_labs_are_counted_by_key():
+    case = _case()
+    state = LearnerState(case["id"], revision=case["revision"])
+    state.reveal("step7_labs", 2)
+
+    assert ("step7_labs", case["fever"]["labs"][2]["key"]) in answers(state.to_dict(case))
+    assert not any(metric == "step7_labs" for metric, _ in answers(state.to_dict()))
+
+
+def test_a_changed_answer_moves_the_count():
+    case = _case()
+    analytics = CohortAnalytics()
+    state = LearnerState(case["id"], revision=case["revision"])
+    state.reveal("step7_labs", 0)
+    analytics.record("cohort", "learner", state.to_dict(case))
+    analytics.record("cohort", "learner", state.to_dict(case))
+    state.reveal("step7_labs", 1)
+    state.step = 7
+    analytics.record("cohort", "learner", state.to_dict(case))
+
+    summary = analytics.summary("cohort", case["id"])
+    labs = [lab["key"] for lab in case["fever"]["labs"][:2]]
+    assert summary["learners"] == 1
+    assert summary["metrics"]["step"] == {7: 1}
+    assert summary["metrics"]["step7_labs"] == {labs[0]: 1, labs[1]: 1}
@@ -0,0 +1,81 @@
+import json
+import os
+import re
+
+import pytest
+
+from mystery_case.cases import CASES_DIR, CaseError, CaseLibrary, parse_case, validate
+
+
+def _data():
+    return json.loads((CASES_DIR / "fever_sore_throat.json").read_text(encoding="utf-8"))
+
+
+def test_the_shipped_case_is_valid():
+    validate(_data())
+
+
+@pytest.mark.parametrize(
+    "edit, message",
+    [
+        (lambda d: d["teaching"].pop("step6"), "teaching.step6"),
+        (lambda d: d["teaching"]["step3"].pop("update"), "teaching.step3.update"),
+        (lambda d: d["teaching"]["step7"].pop("notes"), "teaching.step7.notes"),
+        (lambda d: d["fever"]["labs"].append(dict(d["fever"]["labs"][0])), "duplicate lab key"),
+        (lambda d: d["tb"]["oi_tests"]["cocci"].pop("reasonable"), "reasonable"),
+        (lambda d: [c.pop("correct", None) for c in d["followup"]["choices"]], "no choice marked correct"),
+    ],
+)
+def test_cases_missing_what_the_app_reads_are_rejected(edit, message):
+    data = _data()
+    edit(data)
+    with pytest.raises(CaseError, match=re.escape(message)):
+        parse_case(json.dumps(data))
+
+
+def _catalogue(tmp_path, ids):
+    for case_id in ids:
+        data = dict(_data(), id=case_id)
+        (tmp_path / f"{case_id}.json").write_text(json.dumps(data), encoding="utf-8")
+    index = {"version": 1, "cases": [{"id": case_id, "title": case_id} for case_id in ids]}
+    (tmp_path / "index.json").write_text(json.dumps(index), encoding="utf-8")
+    return tmp_path
+
+
+def test_library_keeps_the_most_recently_opened_cases(tmp_path):
+    library = CaseLibrary(_catalogue(tmp_path, ["a", "b", "c"]), capacity=2)
+
+    a = library.get("a")
+    library.get("b")
+    assert library.get("a") is a  # a hit; "b" is now the least recently used
+    library.get("c")
+
+    stats = library.stats()
+    assert stats["loaded"] == ["a", "c"]
+    assert (stats["hits"], stats["loads"], stats["evictions"]) == (1, 3, 1)
+    assert library.get("b") is not None and library.stats()["loaded"] == ["c", "b"]
+
+
+def test_library_reparses_a_changed_file(tmp_path):
+    library = CaseLibrary(_catalogue(tmp_path, ["a"]))
+    before = library.get("a")
+    path = tmp_path / "a.json"
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data["title"] = "Edited"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1))
+
+    after = library.get("a")
+    assert after["title"] == "Edited"
+    assert after["revision"] != before["revision"]
+
+
+def test_library_rejects_unknown_and_mismatched_cases(tmp_path):
+    library = CaseLibrary(_catalogue(tmp_path, ["a"]))
+    with pytest.raises(CaseError, match="unknown case"):
+        library.get("missing")
+
+    (tmp_path / "a.json").write_text(json.dumps(dict(_data(), id="other")), encoding="utf-8")
+    os.utime(tmp_path / "a.json", ns=(0, 1))
+    with pytest.raises(CaseError, match="does not match the index"):
+        library.get("a")
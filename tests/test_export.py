@@ -0,0 +1,50 @@
+import csv
+
+import pytest
+
+from mystery_case import export
+from mystery_case.cases import shared_library
+from mystery_case.progress import SQLiteProgressStore
+from mystery_case.state import LearnerState
+
+
+def test_missing_store_exits_without_creating_it(tmp_path, capsys):
+    path = tmp_path / "typo.sqlite3"
+
+    with pytest.raises(SystemExit) as exc:
+        export.main([str(tmp_path / "out.csv"), "--store", f"sqlite:///{path}"])
+
+    assert exc.value.code != 0
+    assert "no progress store" in str(exc.value.code)
+    assert not path.exists()
+
+
+def test_export_reads_the_store_read_only(tmp_path):
+    path = tmp_path / "progress.sqlite3"
+    store = SQLiteProgressStore(path)
+    store.save_many({("learner-1", "fever_sore_throat"): LearnerState("fever_sore_throat", step=3).to_dict()})
+    store.close()
+    path.chmod(0o444)
+    out = tmp_path / "out.csv"
+
+    assert export.main([str(out), "--store", f"sqlite:///{path}"]) == 0
+
+    with open(out, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [(row["learner_id"], row["step"]) for row in rows] == [("learner-1", "3")]
+
+
+def test_labs_are_named_as_of_the_snapshot_revision():
+    library = shared_library()
+    case = library.get(library.default_id)
+    state = LearnerState(case["id"], revision=case["revision"])
+    state.reveal("step7_labs", 1)
+    first = case["fever"]["labs"][1]["key"]
+    keyed = state.to_dict(case)
+    keyed["lab_keys"]["step7_labs"] = ["renamed_lab"]  # as saved before an edit to the case file
+    current = state.to_dict()
+    stale = dict(current, revision="0" * 16)
+
+    assert export._lab_keys(case, keyed, "step7_labs") == "renamed_lab"
+    assert export._lab_keys(case, current, "step7_labs") == first
+    assert export._lab_keys(case, stale, "step7_labs") == "1"
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+from walkthrough import new_session
+
+from mystery_case.images import BUILD_DIR, ImageStore, load_manifest, manifest_path, shared_store
+
+
+@pytest.fixture
+def assets(built_assets):
+    """Built assets with the vignette's derivative deleted."""
+    built = json.loads(manifest_path(built_assets).read_text())["images"]["vignette.png"]["derivative"]["file"]
+    (built_assets / BUILD_DIR / built).unlink()
+    return built_assets
+
+
+def test_missing_built_file_falls_back_to_the_source(assets, caplog):
+    store = ImageStore(assets, manifest=load_manifest(assets))
+
+    assert "stale build manifest entry for vignette.png" in caplog.text
+    assert store.stale("vignette.png")
+    data = store.get("vignette.png")
+    assert data is not None and data[:2] == b"\xff\xd8"  # an opaque PNG becomes a JPEG derivative
+    assert store.get("vignette.png") is data  # cached, not re-encoded
+    assert not store.stale("rash.png")
+
+
+def test_app_still_renders_the_image(assets, monkeypatch):
+    monkeypatch.chdir(assets.parent)
+    shared_store.cache_clear()
+    try:
+        at = new_session()
+        at.run()
+    finally:
+        shared_store.cache_clear()
+
+    assert not at.exception
+    captions = [img.caption for node in at.main if node.type == "image" for img in node.proto.imgs]
+    assert "Vignette image" in captions
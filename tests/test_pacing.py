@@ -0,0 +1,24 @@
+import threading
+import time
+
+from mystery_case.pacing import PacingBoard
+from mystery_case.progress import SQLiteProgressStore
+
+
+def test_reads_are_served_from_the_board_and_refreshed_in_the_background(tmp_path, monkeypatch):
+    store = SQLiteProgressStore(tmp_path / "progress.sqlite3")
+    instructor, learners = PacingBoard(store), PacingBoard(store, refresh=0.05)
+    assert learners.releases("cohort") == ()  # the first read of a cohort loads it
+    instructor.release("cohort", 3, stagger=0)
+
+    loaded_on = []
+    load_releases = store.load_releases
+    monkeypatch.setattr(
+        store, "load_releases", lambda cohort: loaded_on.append(threading.current_thread().name) or load_releases(cohort)
+    )
+    deadline = time.monotonic() + 2
+    while learners.open_step("cohort", "learner") != 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert learners.open_step("cohort", "learner") == 3
+    assert loaded_on and set(loaded_on) == {"pacing-refresh"}
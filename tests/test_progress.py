@@ -0,0 +1,136 @@
+import time
+
+import pytest
+
+from mystery_case.progress import MemoryProgressStore, RedisProgressStore, SQLiteProgressStore, WriteBehind
+
+
+@pytest.fixture
+def store(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    import redis
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", lambda url: fakeredis.FakeRedis(server=server))
+    store = RedisProgressStore("redis://localhost:6379/0")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    store = SQLiteProgressStore(tmp_path / "progress.sqlite3")
+    yield store
+    store.close()
+
+
+class RecordingStore(MemoryProgressStore):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+        self.fail_next = None  # called instead of saving, once
+
+    def save_many(self, snapshots: dict):
+        if self.fail_next is not None:
+            fail, self.fail_next = self.fail_next, None
+            fail()
+            raise OSError("store unavailable")
+        self.batches.append(dict(snapshots))
+        super().save_many(snapshots)
+
+
+def _snapshot(step):
+    return {"case_id": "fever_sore_throat", "step": step}
+
+
+def test_redis_save_many_and_load(store):
+    store.save_many({("a", "fever_sore_throat"): _snapshot(2), ("b", "fever_sore_throat"): _snapshot(3)})
+    store.save_many({("a", "fever_sore_throat"): _snapshot(4)})
+
+    assert store.load("a", "fever_sore_throat") == _snapshot(4)
+    assert store.load("b", "fever_sore_throat") == _snapshot(3)
+    assert store.load("c", "fever_sore_throat") is None
+
+
+def test_redis_scan_sees_every_record_while_others_save(store):
+    store.save_many({(f"learner-{i}", "fever_sore_throat"): _snapshot(1) for i in range(300)})
+
+    seen = {}
+    for n, (learner_id, case_id, updated_at, snapshot) in enumerate(store.scan(batch_size=10)):
+        seen[learner_id] = snapshot
+        if n % 10 == 0:  # records move to the end of the update-time order mid-scan
+            store.save_many({(f"learner-{i}", "fever_sore_throat"): _snapshot(2) for i in range(n, 300, 7)})
+
+    assert set(seen) == {f"learner-{i}" for i in range(300)}
+
+
+def test_redis_releases(store):
+    store.save_releases("cohort-a", [{"step": 3, "at": 1.0, "stagger": 0.0}])
+    store.save_releases("cohort-b", [])
+
+    assert store.load_releases("cohort-a") == [{"step": 3, "at": 1.0, "stagger": 0.0}]
+    assert store.load_releases("cohort-b") == []
+
+    store.save_releases("cohort-a", [])
+    assert store.load_releases("cohort-a") == []
+
+
+def test_sqlite_save_many_load_and_scan(sqlite_store):
+    sqlite_store.save_many({("a", "fever_sore_throat"): _snapshot(2), ("b", "fever_sore_throat"): _snapshot(3)})
+    time.sleep(0.01)
+    sqlite_store.save_many({("a", "fever_sore_throat"): _snapshot(4)})
+
+    assert sqlite_store.load("a", "fever_sore_throat") == _snapshot(4)
+    assert sqlite_store.load("a", "other_case") is None
+    rows = list(sqlite_store.scan(batch_size=1))
+    assert [(learner_id, snapshot["step"]) for learner_id, _, _, snapshot in rows] == [("b", 3), ("a", 4)]
+
+
+def test_sqlite_releases(sqlite_store):
+    sqlite_store.save_releases("cohort-a", [{"step": 3, "at": 1.0, "stagger": 0.0}])
+    assert sqlite_store.load_releases("cohort-a") == [{"step": 3, "at": 1.0, "stagger": 0.0}]
+
+    sqlite_store.save_releases("cohort-a", [])
+    assert sqlite_store.load_releases("cohort-a") == []
+
+
+def test_write_behind_coalesces_and_reads_its_own_writes():
+    backend = RecordingStore()
+    writer = WriteBehind(backend, interval=3600)
+    writer.put("a", _snapshot(2))
+    writer.put("a", _snapshot(3))
+    writer.put("b", _snapshot(2))
+
+    assert writer.get("a", "fever_sore_throat") == _snapshot(3)
+    assert backend.load("a", "fever_sore_throat") is None
+    writer.flush()
+
+    assert backend.batches == [{("a", "fever_sore_throat"): _snapshot(3), ("b", "fever_sore_throat"): _snapshot(2)}]
+    assert writer.stats() == {"pending": 0, "batches": 1, "written": 2}
+
+
+def test_write_behind_flushes_early_at_max_batch():
+    backend = RecordingStore()
+    writer = WriteBehind(backend, interval=3600, max_batch=3)
+    for learner_id in "abc":
+        writer.put(learner_id, _snapshot(1))
+
+    deadline = time.monotonic() + 2
+    while not backend.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(backend.batches) == 1 and len(backend.batches[0]) == 3
+
+
+def test_write_behind_requeues_a_failed_batch_without_losing_newer_snapshots():
+    backend = RecordingStore()
+    writer = WriteBehind(backend, interval=3600)
+    writer.put("a", _snapshot(2))
+    writer.put("b", _snapshot(2))
+    backend.fail_next = lambda: writer.put("a", _snapshot(5))  # arrives while the batch is being written
+
+    writer.flush()
+    assert backend.batches == []
+    assert writer.stats()["pending"] == 2
+
+    writer.flush()
+    assert backend.batches == [{("a", "fever_sore_throat"): _snapshot(5), ("b", "fever_sore_throat"): _snapshot(2)}]
@@ -0,0 +1,27 @@
+from mystery_case import report
+from mystery_case.cases import shared_library
+from mystery_case.state import LearnerState
+
+
+def test_a_failed_build_is_kept_until_an_explicit_retry(monkeypatch):
+    library = shared_library()
+    case = library.get(library.default_id)
+    snapshot = LearnerState(case["id"]).to_dict()
+    builds = []
+
+    def failing_build(case, snapshot):
+        builds.append(case["id"])
+        raise RuntimeError("no report")
+
+    monkeypatch.setattr(report, "build_report", failing_build)
+    reports = report.ReportBuilder(workers=1)
+
+    failed = reports.request(case, snapshot)
+    assert isinstance(failed.exception(timeout=5), RuntimeError)
+    assert reports.request(case, snapshot) is failed
+    assert builds == [case["id"]]
+
+    monkeypatch.setattr(report, "build_report", lambda case, snapshot: b"<html>")
+    rebuilt = reports.request(case, snapshot, retry=True)
+    assert rebuilt is not failed
+    assert rebuilt.result(timeout=5) == b"<html>"
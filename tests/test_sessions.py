@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+from walkthrough import new_session
+
+from mystery_case.sessions import SessionRegistry, shared_registry
+
+
+def _entry(at):
+    # AppTest wraps the session's SessionState in a SafeSessionState of its own.
+    session_state = at.session_state._state._state
+    for _, entry, state in shared_registry()._live():
+        if state is session_state:
+            return entry
+    raise AssertionError("session not registered")
+
+
+def test_reruns_update_the_same_session():
+    at = new_session()
+    at.run()
+    started = _entry(at).started
+
+    at.run()
+    entry = _entry(at)
+    assert entry.runs == 2
+    assert entry.started == started
+
+
+def test_closed_sessions_are_dropped_on_the_write_path():
+    alive = {"a": True, "b": True}
+    registry = SessionRegistry(is_alive=alive.get, prune_interval=0)
+    registry.touch("a", SimpleNamespace(), "fever_sore_throat")
+    registry.touch("b", SimpleNamespace(), "fever_sore_throat")
+
+    alive["a"] = False
+    registry.touch("b", SimpleNamespace(), "fever_sore_throat")
+
+    assert set(registry._sessions) == {"b"}
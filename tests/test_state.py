@@ -0,0 +1,73 @@
+import json
+
+from walkthrough import new_session
+
+from mystery_case.cases import parse_case, shared_library
+from mystery_case.progress import shared_progress
+from mystery_case.state import Flag, LearnerState
+
+
+def _case():
+    library = shared_library()
+    return library.get(library.default_id)
+
+
+def _edited(case):
+    """``case`` with its fever labs reversed and one OI test retired (a new revision)."""
+    data = json.loads(shared_library().index[case["id"]].path.read_text())
+    data["fever"]["labs"].reverse()
+    del data["tb"]["oi_tests"]["cocci"]
+    return parse_case(json.dumps(data))
+
+
+def _learner(case) -> LearnerState:
+    state = LearnerState(case["id"], step=8, revision=case["revision"])
+    state.reveal("step7_labs", 0)
+    state.reveal("step7_labs", 2)
+    state.step8_oi_selected = ("cocci", "serum_crag")
+    return state
+
+
+def test_resume_on_an_edited_case_maps_labs_by_key():
+    case = _case()
+    edited = _edited(case)
+    snapshot = _learner(case).to_dict(case)
+
+    resumed = LearnerState.from_dict(snapshot, edited)
+
+    assert resumed.revision == edited["revision"]
+    assert resumed.lab_keys(edited)["step7_labs"] == [lab for lab in reversed(snapshot["lab_keys"]["step7_labs"])]
+    assert resumed.step8_oi_selected == ("serum_crag",)
+
+
+def test_resume_on_the_same_revision_keeps_everything():
+    case = _case()
+    state = _learner(case)
+    assert LearnerState.from_dict(state.to_dict(case), case) == state
+
+
+def test_snapshot_without_revision_clears_labs():
+    case = _case()
+    snapshot = _learner(case).to_dict()
+    del snapshot["revision"]
+
+    resumed = LearnerState.from_dict(snapshot, case)
+
+    assert resumed.step7_labs == 0
+    assert resumed.step8_oi_selected == ("cocci", "serum_crag")
+
+
+def test_app_resumes_a_snapshot_with_a_retired_oi_test():
+    case = _case()
+    state = _learner(case)
+    state.set(Flag.VIEWED_ALL | Flag.STEP8_READY)
+    snapshot = state.to_dict(case)
+    snapshot["step8_oi_selected"].append("retired_test")
+    shared_progress("none").put("learner-with-stale-keys", snapshot)
+
+    at = new_session()
+    at.query_params["learner"] = "learner-with-stale-keys"
+    at.run()
+
+    assert not at.exception
+    assert at.session_state["learner"].step8_oi_selected == ("cocci", "serum_crag")
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from starlette.routing import Router
+
+from mystery_case.images import BUILD_DIR, shared_store
+from mystery_case.static_route import CACHE_CONTROL, ROUTE_PREFIX, asset_routes, asset_url
+
+
+@pytest.fixture
+def route(built_assets):
+    """The asset route as an ASGI app over freshly built assets, with the store it reads."""
+    shared_store.cache_clear()
+    yield Router(asset_routes(built_assets)), shared_store(built_assets)
+    shared_store.cache_clear()
+
+
+def get(app, path: str, headers=()):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body
+
+
+def test_serves_built_images_with_a_strong_etag(route):
+    app, store = route
+    url = asset_url(store, "vignette.png")
+    assert url.startswith(ROUTE_PREFIX)
+
+    status, headers, body = get(app, url)
+
+    assert status == 200
+    assert headers["content-type"] == "image/jpeg"
+    assert headers["cache-control"] == CACHE_CONTROL
+    assert headers["etag"] == f'"{store.manifest["images"]["vignette.png"]["derivative"]["sha256"]}"'
+    assert body == store.get("vignette.png")
+
+
+def test_answers_a_matching_if_none_match_with_304(route):
+    app, store = route
+    url = asset_url(store, "vignette.png")
+    etag = get(app, url)[1]["etag"]
+
+    status, headers, body = get(app, url, [("if-none-match", etag)])
+
+    assert (status, body) == (304, b"")
+    assert headers["etag"] == etag
+    assert get(app, url, [("if-none-match", '"other"')])[0] == 200
+
+
+def test_unknown_and_stale_files_are_not_found(route, built_assets):
+    app, store = route
+    url = asset_url(store, "vignette.png")
+    assert get(app, ROUTE_PREFIX + "vignette-000000000000.jpg")[0] == 404
+
+    (built_assets / BUILD_DIR / url[len(ROUTE_PREFIX):]).unlink()  # removed after the server started
+
+    assert get(app, url)[0] == 404
+    assert store.stale("vignette.png")
+    assert asset_url(store, "vignette.png") is None
@@ -0,0 +1,18 @@
+import pytest
+from walkthrough import new_session
+
+
+def _timings_panel(at) -> bool:
+    return any(e.label.startswith("⏱ Step timings") for e in at.sidebar.expander)
+
+
+@pytest.mark.parametrize("profile, shown", [("1", False), ("wrong", False), ("secret", True)])
+def test_profile_panel_needs_the_admin_token(monkeypatch, profile, shown):
+    monkeypatch.setenv("MYSTERY_CASE_ADMIN_TOKEN", "secret")
+    monkeypatch.delenv("MYSTERY_CASE_PROFILE", raising=False)
+    at = new_session()
+    at.query_params["profile"] = profile
+    at.run()
+
+    assert not at.exception
+    assert _timings_panel(at) is shown
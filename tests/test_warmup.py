@@ -0,0 +1,40 @@
+import logging
+
+from mystery_case import blocks, warmup
+from mystery_case.cases import CaseLibrary
+from mystery_case.images import ImageStore
+
+
+class BrokenLibrary(CaseLibrary):
+    def get(self, case_id):
+        raise ValueError(f"cannot parse {case_id}")
+
+
+def test_failures_are_logged_and_the_warm_up_still_finishes(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(warmup, "PRELOAD_MODULES", ("json", "no_such_module"))
+    library = BrokenLibrary()
+    w = warmup.Warmup(library, ImageStore(tmp_path))
+
+    with caplog.at_level(logging.ERROR, logger=warmup.__name__):
+        w.run()
+
+    status = w.status()
+    assert w.ready and status["ready"]
+    assert status["cases"] == []
+    assert status["modules"] == ["json"]
+    assert set(status["errors"]) == {*library.index, "no_such_module"}
+    assert "ModuleNotFoundError" in status["errors"]["no_such_module"]
+    assert any("no_such_module" in r.getMessage() for r in caplog.records)
+
+
+def test_warm_case_fills_the_shared_caches(tmp_path):
+    library = CaseLibrary()
+    case = library.get(library.default_id)
+    store = ImageStore(tmp_path)
+
+    warmup.warm_case(case, store)
+
+    assert (case["id"], case["revision"]) in blocks._blocks
+    assert (case["id"], case["revision"]) in blocks._tables
+    stats = store.stats()
+    assert set(case["images"].values()) <= set(stats["cached"]) | set(stats["missing"])